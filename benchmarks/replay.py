@@ -0,0 +1,223 @@
+## Replay harness.
+#  Feeds recorded intraday payloads through the whole pipeline, as if the
+#  bars were arriving live. A Watcher runs a CrossoverWatch per symbol on a
+#  fake clock, and every poll serves a compact payload that is parsed like
+#  an API response. Each watch also updates an EMA and an SMA, and alerts
+#  through a stub.
+#  Reports the latency of each bar from its close to the end of its
+#  processing, including the fetch and parse of its payload, the latency to
+#  each alert, and the sustained throughput.
+#
+#  Usage: python -m benchmarks.replay [--payloads tests/testData.dat] [--symbols 100] [--speedup 0]
+
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import os
+import tempfile
+import time
+import marketsnake.alerts.alert as alert
+import marketsnake.data.alphavantage as alphavantage
+import marketsnake.indicators.EMA as EMA
+import marketsnake.indicators.SMA as SMA
+import marketsnake.metrics as metrics
+import marketsnake.watcher as watcher
+import benchmarks.run as run
+import benchmarks.synthetic as synthetic
+
+## Alert that only records when it was called.
+class StubAlert(alert.AbstractAlert):
+	def __init__(self):
+		super().__init__(None)
+		self.times = []
+
+	def __call__(self, body):
+		self.times.append(time.perf_counter())
+
+## Fake clock that records when each bar close is reached.
+#  With a speedup, sleeping takes that many times less than the clock moves.
+class ReplayClock(watcher.FakeClock):
+	def __init__(self, start, speedup = None):
+		super().__init__(start)
+		self.speedup = speedup
+		## Wall time at which the clock last reached the time it slept until.
+		self.arrival = time.perf_counter()
+
+	async def sleep(self, seconds):
+		if self.speedup:
+			await asyncio.sleep(max(seconds, 0) / self.speedup)
+		await super().sleep(seconds)
+		self.arrival = time.perf_counter()
+
+## Stand-in data source serving compact payloads.
+#  Every poll renders the latest bars, including the one still forming, as
+#  an intraday payload and parses it, like AsyncAlphaVantage does with a response.
+class PayloadSource(object):
+	## @param seriesBySymbol is a dictionary of symbols to price series.
+	#  @param limit is the number of bars in a payload.
+	def __init__(self, seriesBySymbol, clock, interval, limit = 100):
+		self.seriesBySymbol = seriesBySymbol
+		self.clock = clock
+		self.interval = interval
+		self.limit = limit
+		self.lines = {}
+		for series in seriesBySymbol.values():
+			if id(series) not in self.lines:
+				self.lines[id(series)] = [self._line(series, i) for i in range(len(series))]
+
+	## Renders a bar as it appears in a payload.
+	@staticmethod
+	def _line(series, position):
+		p = series._row(position)
+		return '%s: {"1. open": "%.4f", "2. high": "%.4f", "3. low": "%.4f", "4. close": "%.4f", "5. volume": "%d"}' % (
+			json.dumps(p.timestamp.strftime("%Y-%m-%d %H:%M:%S")), p.open, p.high, p.low, p.close, p.volume)
+
+	async def Intraday(self, symbol, interval):
+		series = self.seriesBySymbol[symbol]
+		end = series._countOlder(self.clock.now(), True)
+		lines = self.lines[id(series)][max(0, end - self.limit):end]
+		payload = '{"Meta Data": {}, "Time Series (%dmin)": {%s}}' % (interval, ', '.join(reversed(lines)))
+		return await asyncio.to_thread(alphavantage.parseIntraday, io.StringIO(payload), interval)
+
+## Watch running the replayed pipeline, and timing every bar it gets.
+class ReplayWatch(watcher.CrossoverWatch):
+	def __init__(self, symbol, interval, clock):
+		super().__init__(symbol, interval, StubAlert())
+		self.clock = clock
+		self.ema = None
+		self.sma = None
+		self.latencies = []
+		self.alertLatencies = []
+
+	def start(self, series):
+		super().start(series)
+		self.ema = EMA.EMATimeSeries.fromTimeSeries(series, 26)
+		self.sma = SMA.SMATimeSeries.fromTimeSeries(series, 20)
+
+	def update(self, periods):
+		alerts = len(self.alert.times)
+		found = super().update(periods)
+		self.ema.extend(periods)
+		self.sma.extend(periods)
+
+		done = time.perf_counter()
+		arrival = self.clock.arrival
+		self.latencies.extend([done - arrival] * len(periods))
+		self.alertLatencies.extend([t - arrival for t in self.alert.times[alerts:]])
+		return found
+
+## Returns a percentile of sorted values, by the nearest rank.
+def percentile(values, p):
+	if not values:
+		return None
+	return values[min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))]
+
+## Parses payloads through AlphaVantage.Intraday.
+#  This loads the bars to replay, and is not part of the latencies.
+#  @returns the price series of each payload, and the seconds spent parsing.
+def parse(payloads, interval, directory):
+	seriesList = []
+	start = time.perf_counter()
+	for payload in payloads:
+		api = alphavantage.AlphaVantage(run._config(directory, os.path.abspath(payload)))
+		seriesList.append(api.Intraday('REPLAY', interval))
+	return seriesList, time.perf_counter() - start
+
+## Replays bars through a watcher with a watch per symbol.
+#  The clock starts at the close of the warmup bars and follows the bar
+#  closes. With a speedup, it moves that many times faster than the
+#  recorded times. Without one, each bar close is reached as soon as the
+#  watcher is done with the last one. Latencies are measured from the bar
+#  close, so they include the time a bar waits for the other symbols.
+#  @param seriesList is a list of price series, used by the symbols in turn.
+#  @param warmup is the number of bars each watch starts with.
+#  @returns a dictionary of results.
+def replay(seriesList, symbols, warmup = 50, speedup = None, interval = 5, maxConcurrent = 4):
+	step = datetime.timedelta(minutes = interval)
+	seriesBySymbol = {'S%d' % i : seriesList[i % len(seriesList)] for i in range(symbols)}
+	start = min([s._row(min(warmup, len(s)) - 1).timestamp for s in seriesList if len(s)]) + step
+	end = max([s[0].timestamp for s in seriesList if len(s)]) + step
+
+	clock = ReplayClock(start, speedup)
+	watches = [ReplayWatch(symbol, interval, clock) for symbol in seriesBySymbol]
+	w = watcher.Watcher(PayloadSource(seriesBySymbol, clock, interval), watches, clock = clock,
+		maxConcurrent = maxConcurrent, delay = 0)
+
+	started = time.perf_counter()
+	asyncio.run(w.run(until = end))
+	elapsed = time.perf_counter() - started
+
+	latencies = sorted([l for watch in watches for l in watch.latencies])
+	alertLatencies = sorted([l for watch in watches for l in watch.alertLatencies])
+	bars = len(latencies)
+	summary = lambda values: {
+		'count' : len(values),
+		'p50' : percentile(values, 50),
+		'p99' : percentile(values, 99),
+		'max' : values[-1] if values else None,
+	}
+	return {
+		'symbols' : symbols,
+		'bars' : bars,
+		'cycles' : w.cycles,
+		'failed' : w.failed,
+		'seconds' : elapsed,
+		'barsPerSecond' : bars / elapsed if elapsed else None,
+		'latency' : summary(latencies),
+		'alertLatency' : summary(alertLatencies),
+	}
+
+def _ms(seconds):
+	return '%9.3fms' % (seconds * 1000) if seconds is not None else '%11s' % '-'
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Market Snake replay harness')
+	parser.add_argument('--payloads', nargs = '+', default = [os.path.join('tests', 'testData.dat')],
+		help = 'recorded AlphaVantage intraday payloads, used by the symbols in turn')
+	parser.add_argument('--synthetic', type = int, help = 'replay a synthetic payload of this many bars instead')
+	parser.add_argument('--interval', type = int, default = 5, help = 'minutes per bar in the payloads')
+	parser.add_argument('--symbols', type = int, nargs = '+', default = [1, 10, 100], help = 'numbers of symbols to simulate')
+	parser.add_argument('--warmup', type = int, default = 50, help = 'bars each symbol starts with')
+	parser.add_argument('--speedup', type = float, default = 0,
+		help = 'times faster than recorded to replay at, or 0 for as fast as possible')
+	parser.add_argument('--max-concurrent', type = int, default = 4, help = 'watches fetched and updated at once')
+	parser.add_argument('--metrics', help = 'file to write a metrics snapshot to, as json or Prometheus text')
+	parser.add_argument('--output', help = 'file to save the results to, as json')
+	args = parser.parse_args()
+
+	if args.metrics:
+		metrics.enable()
+
+	with tempfile.TemporaryDirectory() as directory:
+		payloads = args.payloads
+		if args.synthetic:
+			payloads = [os.path.join(directory, 'synthetic.json')]
+			with open(payloads[0], 'w') as f:
+				synthetic.writePayload(f, args.synthetic, args.interval)
+		seriesList, parseSeconds = parse(payloads, args.interval, directory)
+
+	print('parsed %d bars in %.4fs' % (sum(len(s) for s in seriesList), parseSeconds))
+	results = []
+	for symbols in args.symbols:
+		result = replay(seriesList, symbols, args.warmup, args.speedup or None, args.interval, args.max_concurrent)
+		results.append(result)
+		print('%6d symbols %10d bars %14.0f bars/s   latency p50 %s p99 %s max %s   %d alerts, p99 %s' % (
+			symbols, result['bars'], result['barsPerSecond'] or 0,
+			_ms(result['latency']['p50']), _ms(result['latency']['p99']), _ms(result['latency']['max']),
+			result['alertLatency']['count'], _ms(result['alertLatency']['p99'])))
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump({
+				'revision' : run._revision(),
+				'payloads' : args.payloads if not args.synthetic else ['synthetic:%d' % args.synthetic],
+				'parseSeconds' : parseSeconds,
+				'results' : results,
+			}, f, indent = 2)
+	if args.metrics:
+		metrics.writeSnapshot(args.metrics)
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
@@ -0,0 +1,160 @@
+## Benchmark suite.
+#  Times ingest, indicators, arithmetic and events over synthetic bars,
+#  and saves the results as json so that runs can be compared.
+#
+#  Usage: python -m benchmarks.run [--sizes 1000 100000] [--output results.json] [--compare old.json]
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import marketsnake.data.alphavantage as alphavantage
+import marketsnake.events.crossover as crossover
+import marketsnake.indicators.EMA as EMA
+import marketsnake.indicators.MACD as MACD
+import marketsnake.indicators.SMA as SMA
+import benchmarks.synthetic as synthetic
+
+## Writes a config file that reads intraday data from a payload file.
+def _config(directory, payload):
+	filename = os.path.join(directory, 'config.ini')
+	with open(filename, 'w') as f:
+		f.write('[TESTING]\nTEST_MODE = on\nTEST_DATA = %s\n\n' % payload)
+		f.write('[API]\nAPI_KEY = x\nENDPOINT_BASE = http://localhost/?apikey=%s&%s\nFUNC_INTRADAY = symbol=%s&interval=%dmin\n')
+	return filename
+
+## Returns the benchmarks for a number of bars.
+#  Each benchmark is a (name, setup) pair, where setup returns the function to time.
+def benchmarks(bars, directory):
+	series = synthetic.generateSeries(bars)
+
+	def parse():
+		payload = os.path.join(directory, 'payload_%d.json' % bars)
+		if not os.path.exists(payload):
+			with open(payload, 'w') as f:
+				synthetic.writePayload(f, bars)
+		api = alphavantage.AlphaVantage(_config(directory, payload))
+		return lambda: api.Intraday('SYNTH', 5)
+
+	def sma():
+		return lambda: SMA.SMATimeSeries.fromTimeSeries(series, 200)
+
+	def ema():
+		return lambda: EMA.EMATimeSeries.fromTimeSeries(series, 26)
+
+	def macd():
+		return lambda: MACD.MACDTimeSeries.fromTimeSeries(series, 26, 12, 9)
+
+	def arithmetic():
+		emaShort = EMA.EMATimeSeries.fromTimeSeries(series, 12)
+		emaLong = EMA.EMATimeSeries.fromTimeSeries(series, 26)
+		return lambda: emaShort - emaLong
+
+	def crossoverEvent():
+		m = MACD.MACDTimeSeries.fromTimeSeries(series, 26, 12, 9)
+		return lambda: crossover.CrossoverEvent(m.base, m.signal)
+
+	return [
+		('parse', parse),
+		('sma', sma),
+		('ema', ema),
+		('macd', macd),
+		('arithmetic', arithmetic),
+		('crossover', crossoverEvent),
+	]
+
+## Times a function.
+#  @returns the best wall time of several runs, and the peak memory of one more.
+def measure(function, repeat, memory = True):
+	best = None
+	for _ in range(repeat):
+		gc.collect()
+		start = time.perf_counter()
+		function()
+		elapsed = time.perf_counter() - start
+		best = elapsed if best is None else min(best, elapsed)
+
+	peak = None
+	if memory:
+		gc.collect()
+		tracemalloc.start()
+		function()
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+	return best, peak
+
+## Returns the current git revision, if there is one.
+def _revision():
+	try:
+		return subprocess.check_output(['git', 'describe', '--always', '--dirty'], stderr = subprocess.DEVNULL).decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+## Runs the suite.
+#  @param only optionally limits the benchmarks by name.
+#  @returns the results, ready to be saved as json.
+def run(sizes, repeat = 3, memory = True, only = None):
+	results = []
+	with tempfile.TemporaryDirectory() as directory:
+		for bars in sizes:
+			for name, setup in benchmarks(bars, directory):
+				if only and name not in only:
+					continue
+				function = setup()
+				seconds, peak = measure(function, repeat, memory)
+				results.append({
+					'name' : name,
+					'bars' : bars,
+					'seconds' : seconds,
+					'barsPerSecond' : bars / seconds if seconds else None,
+					'peakBytes' : peak,
+				})
+				print('%-12s %10d bars %10.4fs %14.0f bars/s %12s peak' % (name, bars, seconds,
+					results[-1]['barsPerSecond'] or 0, '%d B' % peak if peak is not None else '-'))
+
+	return {
+		'revision' : _revision(),
+		'python' : platform.python_version(),
+		'machine' : platform.machine(),
+		'results' : results,
+	}
+
+## Prints the change in time and memory of each benchmark against an earlier run.
+def compare(current, previous):
+	old = {(r['name'], r['bars']) : r for r in previous['results']}
+	print('\nCompared with %s:' % (previous.get('revision') or 'previous run'))
+	for r in current['results']:
+		o = old.get((r['name'], r['bars']))
+		if o is None:
+			continue
+		memory = ''
+		if r['peakBytes'] and o['peakBytes']:
+			memory = '%+7.1f%% memory' % ((r['peakBytes'] / o['peakBytes'] - 1) * 100)
+		print('%-12s %10d bars %+7.1f%% time %s' % (r['name'], r['bars'], (r['seconds'] / o['seconds'] - 1) * 100, memory))
+
+def main():
+	parser = argparse.ArgumentParser(description = 'Market Snake benchmarks')
+	parser.add_argument('--sizes', type = int, nargs = '+', default = [1000, 10000, 100000],
+		help = 'numbers of bars to benchmark, from 10^3 up to 10^7')
+	parser.add_argument('--repeat', type = int, default = 3, help = 'runs to take the best time of')
+	parser.add_argument('--only', nargs = '+', help = 'names of the benchmarks to run')
+	parser.add_argument('--no-memory', action = 'store_true', help = 'skip measuring peak memory')
+	parser.add_argument('--output', help = 'file to save the results to, as json')
+	parser.add_argument('--compare', help = 'results of an earlier run to compare with')
+	args = parser.parse_args()
+
+	results = run(args.sizes, args.repeat, not args.no_memory, args.only)
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent = 2)
+	if args.compare:
+		with open(args.compare) as f:
+			compare(results, json.load(f))
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
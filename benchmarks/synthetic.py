@@ -0,0 +1,54 @@
+## Synthetic OHLCV data for benchmarks.
+#  Prices follow a random walk, so indicators see realistic crossovers.
+
+import array
+import datetime
+import json
+import random
+import marketsnake.core as core
+
+## Generates bars as columns.
+#  @param bars is the number of bars.
+#  @param interval is the number of minutes per bar.
+#  @param seed makes the data repeatable.
+#  @returns int64 timestamps and a dictionary of columns, oldest first.
+def generateColumns(bars, interval = 5, start = datetime.datetime(2018, 1, 2, 9, 30), seed = 0):
+	rng = random.Random(seed)
+	step = interval * 60 * 1000000
+	first = core.toTimestamp(start)
+	timestamps = array.array('q', range(first, first + bars * step, step))
+
+	opens, highs, lows, closes = array.array('d'), array.array('d'), array.array('d'), array.array('d')
+	volumes = array.array('q')
+	price = 100.0
+	for _ in range(bars):
+		close = max(1.0, price + rng.gauss(0, 0.2))
+		spread = abs(rng.gauss(0, 0.1))
+		opens.append(round(price, 4))
+		highs.append(round(max(price, close) + spread, 4))
+		lows.append(round(min(price, close) - spread, 4))
+		closes.append(round(close, 4))
+		volumes.append(rng.randint(1000, 1000000))
+		price = close
+
+	return timestamps, {'open' : opens, 'high' : highs, 'low' : lows, 'close' : closes, 'volume' : volumes}
+
+## Generates a PriceTimeSeries of synthetic bars.
+def generateSeries(bars, interval = 5, seed = 0):
+	timestamps, columns = generateColumns(bars, interval, seed = seed)
+	series = core.PriceTimeSeries()
+	series.extendColumns(timestamps, columns)
+	return series
+
+## Writes synthetic bars as an AlphaVantage intraday payload.
+#  Like the API, the bars are written newest first.
+def writePayload(f, bars, interval = 5, seed = 0):
+	timestamps, columns = generateColumns(bars, interval, seed = seed)
+	f.write('{\n    "Meta Data": {\n        "1. Information": "Synthetic",\n        "4. Interval": "%dmin"\n    },\n' % interval)
+	f.write('    "Time Series (%dmin)": {\n' % interval)
+	for i in range(bars - 1, -1, -1):
+		f.write('        %s: {"1. open": "%.4f", "2. high": "%.4f", "3. low": "%.4f", "4. close": "%.4f", "5. volume": "%d"}%s\n' % (
+			json.dumps(core.fromTimestamp(timestamps[i]).strftime("%Y-%m-%d %H:%M:%S")),
+			columns['open'][i], columns['high'][i], columns['low'][i], columns['close'][i], columns['volume'][i],
+			',' if i else ''))
+	f.write('    }\n}\n')
\ No newline at end of file
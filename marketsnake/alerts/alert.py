@@ -17,4 +17,17 @@ class AbstractAlert(object):
 		self.callback = callback
 
 	def alert(self):
-		self.callback()
\ No newline at end of file
+		self.callback()
+
+	## Returns a key for merging alerts into one digest, or None.
+	#  Alerts with the same key that fire close together can be sent
+	#  together with sendDigest.
+	def digestKey(self):
+		return None
+
+	## Sends several alerts with the same digest key at once.
+	#  By default they are simply sent one by one.
+	#  @param entries is a list of (alert, args) pairs.
+	def sendDigest(self, entries):
+		for a, args in entries:
+			a(*args)
\ No newline at end of file
@@ -0,0 +1,158 @@
+## Background alert dispatch.
+#  Alerts are queued and sent from a worker thread, so that a slow or
+#  dropped connection doesn't stall the caller. Alerts that fire close
+#  together are merged into digests.
+
+import logging
+import queue
+import threading
+import time
+import marketsnake.alerts.alert as alert
+import marketsnake.metrics as metrics
+
+logger = logging.getLogger(__name__)
+
+## Alert that queues on a dispatcher rather than sending right away.
+#  It can be passed to an event in place of the alert it wraps.
+class QueuedAlert(alert.AbstractAlert):
+	def __init__(self, dispatcher, wrapped):
+		super().__init__(wrapped)
+		self.dispatcher = dispatcher
+		self.wrapped = wrapped
+
+	def alert(self):
+		self.dispatcher.submit(self.wrapped)
+
+	def __call__(self, *args):
+		return self.dispatcher.submit(self.wrapped, *args)
+
+## Sends alerts from a background thread.
+class AlertDispatcher(object):
+	## Creates a dispatcher.
+	#  @param maxQueue is the number of alerts that can wait to be sent.
+	#  @param policy decides what happens when the queue is full:
+	#  'block' waits for space, 'dropNewest' drops the new alert, and
+	#  'dropOldest' drops the oldest queued alert to make room.
+	#  @param digestWindow is the number of seconds to collect alerts for
+	#  before sending them, so that they can be merged into digests.
+	def __init__(self, maxQueue = 1000, policy = 'block', digestWindow = 0.0):
+		if policy not in ('block', 'dropNewest', 'dropOldest'):
+			raise ValueError("Unknown policy %s" % policy)
+
+		self.queue = queue.Queue(maxQueue)
+		self.policy = policy
+		self.digestWindow = digestWindow
+		self.thread = None
+
+		self.sent = 0
+		self.dropped = 0
+		self.failed = 0
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	## Starts the worker thread.
+	def start(self):
+		if self.thread is None:
+			self.thread = threading.Thread(target = self._run, name = 'AlertDispatcher', daemon = True)
+			self.thread.start()
+
+	## Sends what is queued, then stops the worker thread.
+	def stop(self, timeout = None):
+		if self.thread is not None:
+			self.queue.put(None)
+			self.thread.join(timeout)
+			self.thread = None
+
+	## Wraps an alert so that calling it queues it on this dispatcher.
+	def wrap(self, a):
+		return QueuedAlert(self, a)
+
+	## Queues an alert to be sent.
+	#  @param args are passed on to the alert, such as the body of an email.
+	#  @returns whether or not the alert was queued.
+	def submit(self, a, *args):
+		item = (a, args, time.monotonic())
+		if self.policy == 'block':
+			self.queue.put(item)
+			return True
+
+		try:
+			self.queue.put_nowait(item)
+			return True
+		except queue.Full:
+			pass
+
+		self.dropped += 1
+		metrics.increment('alerts_dropped')
+		if self.policy == 'dropNewest':
+			return False
+
+		# Drop the oldest alert to make room
+		try:
+			self.queue.get_nowait()
+		except queue.Empty:
+			pass
+		try:
+			self.queue.put_nowait(item)
+			return True
+		except queue.Full:
+			return False
+
+	## Collects the alerts that fire within the digest window.
+	#  @returns the alerts, and whether or not the dispatcher was stopped.
+	def _collect(self, first):
+		batch = [first]
+		deadline = time.monotonic() + self.digestWindow
+		while True:
+			remaining = deadline - time.monotonic()
+			try:
+				item = self.queue.get(timeout = remaining) if remaining > 0 else self.queue.get_nowait()
+			except queue.Empty:
+				return batch, False
+			if item is None:
+				return batch, True
+			batch.append(item)
+
+	## Sends a batch of alerts, merging those with the same digest key.
+	#  The time from submitting each alert to sending it is recorded as
+	#  alert_latency_seconds.
+	def _send(self, batch):
+		groups = {}
+		for i, (a, args, submitted) in enumerate(batch):
+			key = a.digestKey() if isinstance(a, alert.AbstractAlert) else None
+			groups.setdefault(key if key is not None else ('single', i), []).append((a, args, submitted))
+
+		for group in groups.values():
+			entries = [(a, args) for a, args, _ in group]
+			try:
+				a = entries[0][0]
+				with metrics.timer('alert_seconds'):
+					if len(entries) == 1:
+						a(*entries[0][1])
+					else:
+						a.sendDigest(entries)
+				self.sent += len(entries)
+				metrics.increment('alerts_sent', len(entries))
+			except Exception:
+				self.failed += len(entries)
+				metrics.increment('alerts_failed', len(entries))
+				logger.exception("Failed to send %d alerts", len(entries))
+
+			if metrics.registry.enabled:
+				now = time.monotonic()
+				for _, _, submitted in group:
+					metrics.observe('alert_latency_seconds', now - submitted)
+
+	def _run(self):
+		stopped = False
+		while not stopped:
+			item = self.queue.get()
+			if item is None:
+				break
+			batch, stopped = self._collect(item)
+			self._send(batch)
\ No newline at end of file
@@ -1,7 +1,9 @@
 import smtplib
+import socket
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import marketsnake.alerts.alert as alert
+import marketsnake.metrics as metrics
 import configparser
 
 class Email(object):
@@ -10,14 +12,46 @@ class Email(object):
 		config.read(configFile)
 		mailOpts = config['MAIL']
 
+		self.host = mailOpts['SMTP_HOST']
+		self.port = mailOpts['SMTP_PORT']
+		self.ssl = mailOpts.getboolean('SMTP_SSL', fallback = True)
+		self.mailAddress = mailOpts['MAIL_ADDRESS']
+		self.password = mailOpts['MAIL_PASSWORD']
+		## Seconds to wait on the SMTP server before giving up on the session.
+		self.timeout = mailOpts.getfloat('SMTP_TIMEOUT', fallback = 30.0)
+
+		self.server = None
+		self.connect()
+
+	## Opens the SMTP session and logs in.
+	#  A session that is already open is dropped first, without waiting on
+	#  the server, since it is usually being replaced because it stopped working.
+	def connect(self):
 		# TODO: Catch errors
-		self.server = smtplib.SMTP_SSL(host=mailOpts['SMTP_HOST'], port=mailOpts['SMTP_PORT'])
+		if self.server is not None:
+			self.server.close()
+			self.server = None
+		if self.ssl:
+			self.server = smtplib.SMTP_SSL(host=self.host, port=self.port, timeout=self.timeout)
+		else:
+			self.server = smtplib.SMTP(host=self.host, port=self.port, timeout=self.timeout)
 		self.server.ehlo()
 
-		self.mailAddress = mailOpts['MAIL_ADDRESS']
+		if self.password:
+			self.server.login(self.mailAddress, self.password)
 
-		self.server.login(self.mailAddress, mailOpts['MAIL_PASSWORD'])
+	## Closes the SMTP session.
+	def close(self):
+		if self.server is not None:
+			try:
+				self.server.quit()
+			except OSError:
+				self.server.close()
+			self.server = None
 
+	## Sends an email.
+	#  If the session was dropped or timed out, it is re-established and the
+	#  email sent again.
 	def sendEmail(self, to, subject, body):
 		msg = MIMEMultipart()
 		msg['From'] = self.mailAddress
@@ -25,12 +59,40 @@ class Email(object):
 		msg['Subject'] = subject
 		msg.attach(MIMEText(body, 'plain'))
 
-		self.server.send_message(msg)
+		with metrics.timer('email_seconds'):
+			try:
+				if self.server is None:
+					self.connect()
+				self.server.send_message(msg)
+			except (smtplib.SMTPServerDisconnected, ConnectionError, socket.timeout):
+				metrics.increment('smtp_reconnects')
+				self.connect()
+				self.server.send_message(msg)
+		metrics.increment('emails_sent')
 
 
 class EmailAlert(alert.AbstractAlert):
 	def __init__(self, email, to, subject):
 		super().__init__(alert.Callback(email.sendEmail, {'to' : to, 'subject' : subject}))
+		self.email = email
+		self.to = to
+		self.subject = subject
 
 	def __call__(self, body):
-		self.callback({'body' : body})
\ No newline at end of file
+		self.callback({'body' : body})
+
+	## Alerts to the same recipient through the same account are merged.
+	def digestKey(self):
+		return (id(self.email), self.to)
+
+	## Sends several alerts to the recipient as one email.
+	#  @param entries is a list of (alert, args) pairs.
+	def sendDigest(self, entries):
+		if len(entries) == 1:
+			a, args = entries[0]
+			return a(*args)
+
+		subjects = set([a.subject for a, _ in entries])
+		subject = self.subject if len(subjects) == 1 else 'Market Snake'
+		body = '\n\n'.join(['%s\n%s' % (a.subject, args[0]) for a, args in entries])
+		self.email.sendEmail(self.to, '%s (%d alerts)' % (subject, len(entries)), body)
\ No newline at end of file
@@ -0,0 +1,125 @@
+## Backtesting engine.
+#  Replays price history through indicators and crossover events, and
+#  simulates trading on the crossovers.
+
+import bisect
+import concurrent.futures
+import math
+import os
+import marketsnake.core as core
+import marketsnake.events.crossover as crossover
+import marketsnake.indicators.cache as cache
+import marketsnake.indicators.MACD as MACD
+from marketsnake.core import Direction
+
+## Results of a backtest.
+class BacktestResult(object):
+	## @param trades is a list of (entry timestamp, exit timestamp, direction, return).
+	def __init__(self, symbol, params, trades):
+		self.symbol = symbol
+		self.params = params
+		self.trades = trades
+
+		returns = [t[3] for t in trades]
+		## Number of trades.
+		self.count = len(trades)
+		## Fraction of trades that made money.
+		self.hitRate = sum([1 for r in returns if r > 0]) / float(len(returns)) if returns else 0.0
+
+		# Compounded equity curve, starting from 1
+		equity, peak, drawdown = 1.0, 1.0, 0.0
+		for r in returns:
+			equity *= 1.0 + r
+			peak = max(peak, equity)
+			drawdown = max(drawdown, 1.0 - equity / peak)
+		## Total compounded return.
+		self.pnl = equity - 1.0
+		## Largest fall of the equity curve from a peak, as a fraction.
+		self.maxDrawdown = drawdown
+
+	def __str__(self):
+		return "%s %s: %d trades, pnl %.2f%%, max drawdown %.2f%%, hit rate %.1f%%" % (
+			self.symbol, self.params, self.count, self.pnl * 100, self.maxDrawdown * 100, self.hitRate * 100)
+
+## Simulates trading on crossovers.
+#  A long position is entered at the close of a Direction.UP crossover and
+#  exited at the close of the next Direction.DOWN crossover. For MACD, UP
+#  is the MACD line crossing above its signal line, see backtestMACD. If allowShort
+#  is set, short positions are taken the other way around. A position still
+#  open at the end is closed at the last close.
+#  @param priceSeries is a PriceTimeSeries.
+#  @param crossovers is a CrossoverEvent, or another series of CrossoverPeriod.
+#  @returns a list of (entry timestamp, exit timestamp, direction, return).
+def simulate(priceSeries, crossovers, allowShort = False):
+	timestamps, closes = priceSeries.timestamps, priceSeries.column('close')
+	if not timestamps:
+		return []
+
+	# Position of each crossover in the price columns, oldest first
+	signals = [(bisect.bisect_left(timestamps, core.toTimestamp(p.timestamp)), p.dir) for p in reversed(crossovers)]
+	signals = [(i, dir) for i, dir in signals if i < len(timestamps)]
+	signals.append((len(timestamps) - 1, None))
+
+	trades = []
+	for (entry, dir), (exit, _) in zip(signals, signals[1:]):
+		if dir is Direction.UP:
+			trades.append((entry, exit, dir, closes[exit] / closes[entry] - 1.0))
+		elif dir is Direction.DOWN and allowShort:
+			trades.append((entry, exit, dir, 1.0 - closes[exit] / closes[entry]))
+
+	return [(core.fromTimestamp(timestamps[i]), core.fromTimestamp(timestamps[j]), dir, r) for i, j, dir, r in trades]
+
+## Backtests MACD crossovers on one price series.
+#  The crossovers are of the MACD line (the base) over its signal line, so
+#  Direction.UP is the bullish crossover, which goes long.
+#  @param params is a dictionary of longPeriod, shortPeriod and signalPeriod.
+#  @param indicatorCache optionally shares EMAs between parameter sets.
+def backtestMACD(symbol, priceSeries, params, allowShort = False, indicatorCache = None):
+	if indicatorCache is not None:
+		macd = indicatorCache.get(MACD.MACDTimeSeries, priceSeries, **params)
+	else:
+		macd = MACD.MACDTimeSeries.fromTimeSeries(priceSeries, **params)
+	event = crossover.CrossoverEvent(macd.signal, macd.base)
+	return BacktestResult(symbol, params, simulate(priceSeries, event, allowShort))
+
+## Backtests every parameter set on one symbol.
+#  This runs inside the worker processes.
+def _backtestSymbol(symbol, priceSeries, paramSets, allowShort):
+	indicatorCache = cache.IndicatorCache()
+	return [backtestMACD(symbol, priceSeries, params, allowShort, indicatorCache) for params in paramSets]
+
+## Backtests many symbols and parameter sets on a pool of worker processes.
+#  Each symbol is one task, so that its parameter sets share EMAs. When there
+#  are fewer symbols than workers, the parameter sets of each symbol are split
+#  into contiguous chunks, one task each, so that every worker has work.
+#  @param seriesBySymbol is a dictionary of symbols to price series.
+#  @param paramSets is a list of MACD parameter dictionaries.
+#  @param maxWorkers is the number of processes, by default one per core.
+#  If it is 1, everything runs in this process.
+#  @returns a list of BacktestResult, by symbol then parameter set.
+def runBacktests(seriesBySymbol, paramSets, allowShort = False, maxWorkers = None):
+	items = list(seriesBySymbol.items())
+	if maxWorkers == 1:
+		return [r for symbol, series in items for r in _backtestSymbol(symbol, series, paramSets, allowShort)]
+
+	workers = maxWorkers or os.cpu_count() or 1
+	chunks = _chunks(paramSets, math.ceil(workers / len(items)) if items else 1)
+	tasks = [(symbol, series, chunk) for symbol, series in items for chunk in chunks]
+	with concurrent.futures.ProcessPoolExecutor(max_workers = workers) as executor:
+		results = executor.map(_backtestSymbol,
+			[t[0] for t in tasks], [t[1] for t in tasks], [t[2] for t in tasks], [allowShort] * len(tasks),
+			chunksize = max(1, math.ceil(len(tasks) / (workers * 4))))
+		return [r for taskResults in results for r in taskResults]
+
+## Splits a list into at most count contiguous chunks of about the same length.
+def _chunks(values, count):
+	count = max(1, min(count, len(values)))
+	size, extra = divmod(len(values), count)
+	bounds = [i * size + min(i, extra) for i in range(count + 1)]
+	return [values[i:j] for i, j in zip(bounds, bounds[1:])]
+
+## Makes every combination of MACD parameters.
+#  Combinations where the short period isn't shorter than the long one are skipped.
+def parameterGrid(longPeriods, shortPeriods, signalPeriods):
+	return [{'longPeriod' : l, 'shortPeriod' : s, 'signalPeriod' : g}
+		for l in longPeriods for s in shortPeriods for g in signalPeriods if s < l]
\ No newline at end of file
@@ -1,12 +1,36 @@
 import datetime
 import sortedcontainers as sc
 import enum
+import array
+import bisect
+import operator
+import sys
+import collections.abc
+
+# Timestamps
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+## Value used where an aligned series has no period.
+NAN = float('nan')
+
+## Converts a datetime into an int64 count of microseconds since the epoch.
+#  This is the representation used by the timestamp column of columnar series.
+def toTimestamp(dt):
+	return (dt - _EPOCH) // _MICROSECOND
+
+## Converts an int64 count of microseconds back into a datetime.
+def fromTimestamp(t):
+	return _EPOCH + datetime.timedelta(microseconds=t)
 
 # Base periods and time series
 
 ## Base class representing a period of anything.
 #  This is inherited by price period, or MA period.
 class AbstractPeriod(object):
+	__slots__ = ('timestamp', 'values')
+
 	## Constructs a period with a timestamp.
 	#  @param timestamp should be a datetime.datetime object.
 	def __init__(self, timestamp, values):
@@ -14,6 +38,10 @@ class AbstractPeriod(object):
 		self.values = values
 
 	def __getattr__(self, key):
+		# Special and missing attributes must not reach values,
+		# or unpickling would recurse before the slots are set.
+		if key.startswith('__') or key == 'values':
+			raise AttributeError(key)
 		return self.values[key]
 
 	# Operators on the timestamps
@@ -52,21 +80,165 @@ class AbstractPeriod(object):
 		return "%s\n%s" % (datetime.datetime.strftime(self.timestamp, "%Y-%m-%d %H:%M:%S"),
 			"\n".join(["\t%s: %s" % (k, v) for k, v in self.values.items()]))
 
-	def __sub__(self, other):
+	## Combines two periods value by value.
+	#  The timestamp and class taken are those of the left.
+	def _combine(self, other, op):
 		if (self.values.keys() != other.values.keys()):
-			raise TypeError("Cannot substract incompatible types %s and %s" % (self.__class__.__name__, other.__class__.__name__))
+			raise TypeError("Cannot %s incompatible types %s and %s" % (op.__name__, self.__class__.__name__, other.__class__.__name__))
 
-		return self.__class__(self.timestamp, **{k : (vs - vo) for ((k, vs), (_, vo)) in zip(self.values.items(), other.values.items())})
+		return self.__class__(self.timestamp, **{k : op(v, other.values[k]) for k, v in self.values.items()})
 
-	def __add__(self, other): 
-		if (self.values.keys() != other.values.keys()):
-			raise TypeError("Cannot substract incompatible types %s and %s" % (self.__class__.__name__, other.__class__.__name__))
-		
-		return self.__class__(self.timestamp, **{k : (vs - vo) for ((k, vs), (_, vo)) in zip(self.values.items(), other.values.items())})
+	def __sub__(self, other):
+		return self._combine(other, operator.sub)
+
+	def __add__(self, other):
+		return self._combine(other, operator.add)
+
+	def __mul__(self, other):
+		return self._combine(other, operator.mul)
+
+	def __truediv__(self, other):
+		return self._combine(other, operator.truediv)
+
+_periodTemplate = """
+def __init__(self, timestamp, {args}):
+	self.timestamp = timestamp
+{assign}
+
+@property
+def values(self):
+	return {{{items}}}
+
+def _combine(self, other, op):
+	if self.__class__ is not other.__class__ and self.values.keys() != other.values.keys():
+		raise TypeError("Cannot %s incompatible types %s and %s" % (op.__name__, self.__class__.__name__, other.__class__.__name__))
+	return self.__class__(self.timestamp, {combine})
+
+def __reduce__(self):
+	return (self.__class__, (self.timestamp, {fields}))
+"""
+
+## Creates a period class with a fixed set of fields.
+#  The fields are stored in __slots__, so they are read directly rather than
+#  through __getattr__, and there is no dictionary per period.
+#  Like namedtuple, the methods are generated for the exact fields.
+#  @param name is the name of the class.
+#  @param fields is a tuple of field names, in constructor order.
+#  @returns a subclass of AbstractPeriod taking (timestamp, *fields).
+def definePeriod(name, fields):
+	fields = tuple(fields)
+	for field in fields:
+		if not field.isidentifier() or field.startswith('_') or field in ('timestamp', 'values'):
+			raise ValueError("Invalid field name %s" % field)
+
+	namespace = {}
+	exec(_periodTemplate.format(
+		args = ', '.join(fields),
+		assign = '\n'.join(['\tself.%s = %s' % (f, f) for f in fields]),
+		items = ', '.join(["'%s' : self.%s" % (f, f) for f in fields]),
+		combine = ', '.join(['op(self.%s, other.%s)' % (f, f) for f in fields]),
+		fields = ''.join(['self.%s, ' % f for f in fields])
+	), namespace)
+
+	body = {k : namespace[k] for k in ('__init__', 'values', '_combine', '__reduce__')}
+	body['__slots__'] = fields
+	body['fields'] = fields
+	# Make the class picklable from the module that defined it
+	body['__module__'] = sys._getframe(1).f_globals.get('__name__', '__main__')
+	return type(name, (AbstractPeriod,), body)
+
+## Aligns two sorted sequences of timestamps with a linear merge join.
+#  @param left and right should both be sorted oldest first.
+#  @param how is 'inner' (timestamps in both), 'left' (timestamps in left)
+#  or 'outer' (timestamps in either).
+#  @returns a list of timestamps, and for each side a list of the
+#  matching indices, with None where that side has no period.
+def mergeJoin(left, right, how = 'inner'):
+	if how not in ('inner', 'left', 'outer'):
+		raise ValueError("Unknown alignment %s" % how)
+
+	timestamps, leftIndices, rightIndices = [], [], []
+	lengthLeft, lengthRight = len(left), len(right)
+	i, j = 0, 0
+
+	# Skip straight to where the two overlap
+	if how == 'inner' and lengthLeft and lengthRight:
+		i = bisect.bisect_left(left, right[0])
+		j = bisect.bisect_left(right, left[0])
+
+	while i < lengthLeft and j < lengthRight:
+		l, r = left[i], right[j]
+		if l == r:
+			timestamps.append(l)
+			leftIndices.append(i)
+			rightIndices.append(j)
+			i += 1
+			j += 1
+		elif l < r:
+			if how != 'inner':
+				timestamps.append(l)
+				leftIndices.append(i)
+				rightIndices.append(None)
+			i += 1
+		else:
+			if how == 'outer':
+				timestamps.append(r)
+				leftIndices.append(None)
+				rightIndices.append(j)
+			j += 1
+
+	if how != 'inner':
+		timestamps.extend(left[i:])
+		leftIndices.extend(range(i, lengthLeft))
+		rightIndices.extend([None] * (lengthLeft - i))
+	if how == 'outer':
+		timestamps.extend(right[j:])
+		leftIndices.extend([None] * (lengthRight - j))
+		rightIndices.extend(range(j, lengthRight))
+
+	return timestamps, leftIndices, rightIndices
+
+## Returns periods oldest first, for streaming them into an indicator.
+#  Time series and their views are newest first, and so are the lists sliced
+#  from them, so series and views are reversed, and so are sequences whose
+#  timestamps run newest first. Anything else, such as a generator, is
+#  taken to be oldest first.
+def oldestFirst(periods):
+	if isinstance(periods, (AbstractTimeSeries, TimeSeriesView, CompoundTimeSeries)):
+		return reversed(periods)
+	if isinstance(periods, collections.abc.Sequence) and len(periods) > 1 and periods[0].timestamp > periods[-1].timestamp:
+		return reversed(periods)
+	return periods
+
+## Returns the name of the column a key reads from a series, or None.
+#  Only keys made by operator.attrgetter for one field of a
+#  ColumnarTimeSeries are read from the column directly.
+def keyColumn(series, key):
+	if not isinstance(series, ColumnarTimeSeries) or not isinstance(key, operator.attrgetter):
+		return None
+	_, args = key.__reduce__()
+	if len(args) == 1 and args[0] in series.columns:
+		return args[0]
+	return None
+
+## Returns a typed array of values, falling back to doubles
+#  if the values do not fit the typecode (for example, NaN in an int column).
+def _typedArray(typecode, values):
+	try:
+		return array.array(typecode, values)
+	except TypeError:
+		return array.array('d', values)
 
 ## Abstract time series that should be inherited from.
 #  Basically a sorted collection of periods with some operators.
 class AbstractTimeSeries(object):
+	## Retention limits, set with setRetention.
+	maxLength = None
+	maxAge = None
+	slack = 0.25
+	## Number of periods evicted from the oldest end so far.
+	trimmed = 0
+
 	## Constructs a sorted time series.
 	#  @param periods is optionally a list of periods to be added.
 	def __init__(self, periodType = AbstractPeriod, periods = None):
@@ -78,24 +250,100 @@ class AbstractTimeSeries(object):
 		#  Index 0 is the newest period.
 		self.periods = sc.SortedSet(periods)
 
+		## Incremented whenever periods are added.
+		#  Caches use this to tell when the series has changed.
+		self.version = 0
+
 	## Gets a time period.
 	#  Index 0 is the newest period.
 	def __getitem__(self, index):
 		if isinstance(index, int):
 			return self.periods[index]
 		elif isinstance(index, slice):
-			if isinstance(index.start, int):
-				return self.periods[index]
-			elif isinstance(index.start, datetime.datetime):
-				# TODO: Implement stepped slices
-				indexStart = self.periods.index(index.start) if index.start is not None else None
-				indexStop = self.periods.index(index.stop) if index.stop is not None else None
-				return self.__getitem__(slice(indexStart, indexStop))
+			if isinstance(index.start, datetime.datetime) or isinstance(index.stop, datetime.datetime):
+				return self._dateSlice(index)
+			return self.periods[index]
 		elif isinstance(index, datetime.datetime):
 			return self.periods[self.periods.index(index)]
 		else:
 			raise KeyError("Cannot fetch item from %s with key type %s" % (self.__class__, type(index)))
 
+	## Returns a view of a slice between two datetimes.
+	#  Like an int slice, start is the newer end and is included, and stop
+	#  is the older end and is excluded. The datetimes don't need to match a period.
+	def _dateSlice(self, index):
+		high = self._countOlder(index.start, inclusive = True) if index.start is not None else len(self)
+		low = self._countOlder(index.stop, inclusive = True) if index.stop is not None else 0
+		return TimeSeriesView(self, range(high - 1, low - 1, -1)[::index.step])
+
+	## Counts the periods older than a datetime, with a bisection.
+	#  @param inclusive also counts a period at exactly the datetime.
+	def _countOlder(self, timestamp, inclusive = False):
+		# The periods are ordered newest first, so bisecting finds the newer ones
+		if inclusive:
+			return len(self.periods) - self.periods.bisect_left(timestamp)
+		return len(self.periods) - self.periods.bisect_right(timestamp)
+
+	## Returns the newest-first index of a datetime.
+	#  @param mode is 'exact', 'floor' (the newest period at or before),
+	#  'ceil' (the oldest period at or after) or 'nearest'.
+	#  Raises a ValueError if there is no such period.
+	def locate(self, timestamp, mode = 'exact'):
+		length = len(self)
+		floor = self._countOlder(timestamp, inclusive = True) - 1
+		if floor >= 0 and self._row(floor).timestamp == timestamp:
+			return length - 1 - floor
+
+		ceil = floor + 1
+		if mode == 'floor':
+			position = floor
+		elif mode == 'ceil':
+			position = ceil if ceil < length else -1
+		elif mode == 'nearest':
+			if floor < 0 or ceil >= length:
+				position = floor if ceil >= length else ceil
+			else:
+				older = timestamp - self._row(floor).timestamp
+				newer = self._row(ceil).timestamp - timestamp
+				position = floor if older <= newer else ceil
+		elif mode == 'exact':
+			position = -1
+		else:
+			raise ValueError("Unknown mode %s" % mode)
+
+		if position < 0:
+			raise ValueError("No %s period for %s" % (mode, timestamp))
+		return length - 1 - position
+
+	## Returns the newest period at or before a datetime.
+	def floor(self, timestamp):
+		return self[self.locate(timestamp, 'floor')]
+
+	## Returns the oldest period at or after a datetime.
+	def ceil(self, timestamp):
+		return self[self.locate(timestamp, 'ceil')]
+
+	## Returns the period closest to a datetime.
+	def nearest(self, timestamp):
+		return self[self.locate(timestamp, 'nearest')]
+
+	## Returns a view of the periods between two datetimes, inclusive.
+	#  Nothing is copied, the view reads from this series.
+	#  @param start and end are datetimes, or None for no limit.
+	#  @param step optionally takes every step-th period, starting from the newest.
+	def window(self, start = None, end = None, step = None):
+		high = self._countOlder(end, inclusive = True) if end is not None else len(self)
+		low = self._countOlder(start) if start is not None else 0
+		return TimeSeriesView(self, range(high - 1, low - 1, -1)[::step])
+
+	## Returns the period at a position, counted from the oldest.
+	def _row(self, position):
+		return self.periods[len(self.periods) - 1 - position]
+
+	## Returns the timestamps as int64, oldest first.
+	def _timestampColumn(self):
+		return array.array('q', [toTimestamp(p.timestamp) for p in reversed(self.periods)])
+
 	## Returns whether or not the series contains a period.
 	#  Note: This does not check the contents or type of period,
 	#  only the timestamp.
@@ -109,37 +357,354 @@ class AbstractTimeSeries(object):
 	def __str__(self):
 		return '\n'.join([str(p) for p in self.periods])
 
+	## Iterates over the periods, oldest first.
+	def __reversed__(self):
+		return reversed(self.periods)
+
+	## Combines two time series value by value.
+	#  The timestamps are aligned with a merge join, and missing values
+	#  (for 'left' and 'outer' alignments) are NaN.
+	#  The class taken is that of the left.
+	#  @param op is a binary function, such as operator.sub.
+	#  @param how is 'inner', 'left' or 'outer', see mergeJoin.
+	#  Either series can be stored in any way, the periods are walked.
+	def arithmetic(self, other, op, how = 'inner'):
+		left = list(reversed(self))
+		right = list(reversed(other))
+		if left and right and left[0].values.keys() != right[0].values.keys():
+			raise TypeError("Cannot %s incompatible types %s and %s" % (op.__name__, self.__class__.__name__, other.__class__.__name__))
+
+		timestamps, leftIndices, rightIndices = mergeJoin([p.timestamp for p in left], [p.timestamp for p in right], how)
+		periodType = (left or right)[0].__class__ if left or right else self.periodType
+		keys = (left or right)[0].values.keys() if left or right else ()
+
+		periods = []
+		for timestamp, i, j in zip(timestamps, leftIndices, rightIndices):
+			lv = left[i].values if i is not None else None
+			rv = right[j].values if j is not None else None
+			periods.append(periodType(timestamp, **{
+				k : op(lv[k] if lv is not None else NAN, rv[k] if rv is not None else NAN) for k in keys
+			}))
+		return self.__class__(periods=periods)
+
 	## Subtracts time series.
-	#  It does this on a value by value basis.
+	#  It does this on a value by value basis, for timestamps in both series.
 	#  The class taken is that of the left.
 	#  Classes are first checked by compatibiltiy (identical values).
 	def __sub__(self, other):
-		# TODO: Wildly inefficient and wasteful, and might rely on a bug
-		trimmedSelf = other.periods.intersection(self.periods)
-		trimmedOther = self.periods.intersection(other.periods)
-		length = len(trimmedSelf)
-		return self.__class__(periods=[trimmedSelf[i] - trimmedOther[i] for i in range(length)])
+		return self.arithmetic(other, operator.sub)
 
 	def __add__(self, other):
-		# TODO: Wildly inefficient and wasteful, and might rely on a bug
-		trimmedSelf = other.periods.intersection(self.periods)
-		trimmedOther = self.periods.intersection(other.periods)
-		length = len(trimmedSelf)
-		return self.__class__(periods=[trimmedSelf[i] + trimmedOther[i] for i in range(length)])
+		return self.arithmetic(other, operator.add)
+
+	def __mul__(self, other):
+		return self.arithmetic(other, operator.mul)
+
+	def __truediv__(self, other):
+		return self.arithmetic(other, operator.truediv)
 
 	## Adds a period to the series.
 	def add(self, period):
 		self.periods.add(period)
+		self.version += 1
+		if self.maxLength is not None or self.maxAge is not None:
+			self._retain()
+
+	## Limits the periods kept, evicting the oldest ones as new ones are added.
+	#  Eviction only drops stored periods. The running state of streaming
+	#  indicators is kept apart, so they carry on updating as before.
+	#  Views taken before an eviction should not be used after it.
+	#  @param maxLength is the number of periods to keep, or None.
+	#  @param maxAge is a timedelta, periods older than this relative to the newest are evicted.
+	#  @param slack is the fraction of periods allowed over the limits before they are evicted.
+	#  Evicting in batches keeps the cost per period O(1), while memory stays
+	#  within (1 + slack) times the limits. With a slack of 0, every period
+	#  added past the limits evicts one, and for columnar series that shifts
+	#  every array, so it costs O(n) per period.
+	def setRetention(self, maxLength = None, maxAge = None, slack = 0.25):
+		self.maxLength = maxLength
+		self.maxAge = maxAge
+		self.slack = slack
+		self._retain()
+
+	## Returns the number of oldest periods outside of the retention limits.
+	def _evictCount(self):
+		length = len(self)
+		count = 0
+		if self.maxLength is not None:
+			count = max(count, length - self.maxLength)
+		if self.maxAge is not None and length:
+			count = max(count, self._countOlder(self[0].timestamp - self.maxAge))
+		return count
+
+	## Evicts the oldest periods once they are far enough over the limits.
+	def _retain(self):
+		count = self._evictCount()
+		if count == 0 or count < self.slack * (len(self) - count):
+			return
+		self._evict(count)
+		self.trimmed += count
+		self.version += 1
+
+	## Drops the oldest periods.
+	def _evict(self, count):
+		for _ in range(count):
+			self.periods.pop()
 
 	## Emplaces a period
 	def emplace(self, timestamp, **args):
 		self.add(self.periodType(timestamp, **args))
 
+## Time series stored as columns rather than as period objects.
+#  Timestamps are kept in a sorted int64 array, and each field in a typed
+#  array of its own. Periods are only built when they are accessed.
+#  Note: The columns are stored oldest first, but indexing is still
+#  newest first, like AbstractTimeSeries.
+class ColumnarTimeSeries(AbstractTimeSeries):
+	## Constructs a columnar time series.
+	#  @param columns is a dictionary of field names to array typecodes.
+	#  @param periods is optionally a list of periods to be added.
+	def __init__(self, periodType = AbstractPeriod, columns = None, periods = None):
+		## Used for emplacing and materializing periods.
+		self.periodType = periodType
+
+		## Timestamps in microseconds, sorted oldest first.
+		self.timestamps = array.array('q')
+
+		## One typed array per field, aligned with the timestamps.
+		self.columns = {k : array.array(t) for k, t in (columns or {}).items()}
+
+		## Incremented whenever rows are added.
+		#  Caches use this to tell when the series has changed.
+		self.version = 0
+
+		if periods is not None:
+			for p in periods:
+				self.add(p)
+
+	## Returns the array of values for a field, oldest first.
+	def column(self, key):
+		return self.columns[key]
+
+	## Returns an empty series of the same type and columns.
+	def _emptyLike(self):
+		series = self.__class__.__new__(self.__class__)
+		series.__dict__.update(self.__dict__)
+		series.timestamps = array.array('q')
+		series.columns = {k : array.array(c.typecode) for k, c in self.columns.items()}
+		series.trimmed = 0
+		return series
+
+	## Converts a newest-first index into a position in the columns.
+	def _position(self, index):
+		length = len(self.timestamps)
+		if index < 0:
+			index += length
+		if index < 0 or index >= length:
+			raise IndexError("%s index out of range" % self.__class__.__name__)
+		return length - 1 - index
+
+	## Returns the position of a timestamp in the columns, or -1.
+	def _find(self, t):
+		i = bisect.bisect_left(self.timestamps, t)
+		if i < len(self.timestamps) and self.timestamps[i] == t:
+			return i
+		return -1
+
+	## Builds the period stored at a position in the columns.
+	def _period(self, position):
+		return self.periodType(fromTimestamp(self.timestamps[position]),
+			**{k : c[position] for k, c in self.columns.items()})
+
+	_row = _period
+
+	def _timestampColumn(self):
+		return self.timestamps
+
+	## Inserts a row of values, keeping the timestamps sorted.
+	#  Rows with a timestamp that is already present are ignored,
+	#  like adding to a set.
+	def _insert(self, t, values):
+		timestamps = self.timestamps
+		if not timestamps or t > timestamps[-1]:
+			timestamps.append(t)
+			for k, c in self.columns.items():
+				c.append(values[k])
+			self.version += 1
+			if self.maxLength is not None or self.maxAge is not None:
+				self._retain()
+			return
+
+		i = bisect.bisect_left(timestamps, t)
+		if timestamps[i] == t:
+			return
+		self.version += 1
+		timestamps.insert(i, t)
+		for k, c in self.columns.items():
+			c.insert(i, values[k])
+		if self.maxLength is not None or self.maxAge is not None:
+			self._retain()
+
+	def _evictCount(self):
+		length = len(self.timestamps)
+		count = 0
+		if self.maxLength is not None:
+			count = max(count, length - self.maxLength)
+		if self.maxAge is not None and length:
+			cutoff = self.timestamps[-1] - self.maxAge // _MICROSECOND
+			count = max(count, bisect.bisect_left(self.timestamps, cutoff))
+		return count
+
+	def _evict(self, count):
+		del self.timestamps[:count]
+		for c in self.columns.values():
+			del c[:count]
+
+	## Returns the newest-first index of a timestamp.
+	#  Raises a ValueError if the timestamp is not in the series.
+	def index(self, timestamp):
+		position = self._find(toTimestamp(timestamp))
+		if position < 0:
+			raise ValueError("%s is not in series" % timestamp)
+		return len(self.timestamps) - 1 - position
+
+	def __getitem__(self, index):
+		if isinstance(index, int):
+			return self._period(self._position(index))
+		elif isinstance(index, slice):
+			if isinstance(index.start, datetime.datetime) or isinstance(index.stop, datetime.datetime):
+				return self._dateSlice(index)
+			return [self._period(len(self.timestamps) - 1 - i) for i in range(len(self.timestamps))[index]]
+		elif isinstance(index, datetime.datetime):
+			return self._period(len(self.timestamps) - 1 - self.index(index))
+		else:
+			raise KeyError("Cannot fetch item from %s with key type %s" % (self.__class__, type(index)))
+
+	def _countOlder(self, timestamp, inclusive = False):
+		if inclusive:
+			return bisect.bisect_right(self.timestamps, toTimestamp(timestamp))
+		return bisect.bisect_left(self.timestamps, toTimestamp(timestamp))
+
+	def __iter__(self):
+		for position in range(len(self.timestamps) - 1, -1, -1):
+			yield self._period(position)
+
+	def __reversed__(self):
+		for position in range(len(self.timestamps)):
+			yield self._period(position)
+
+	## Returns whether or not the series contains a period or datetime.
+	def __contains__(self, value):
+		timestamp = value if isinstance(value, datetime.datetime) else value.timestamp
+		return self._find(toTimestamp(timestamp)) >= 0
+
+	def __len__(self):
+		return len(self.timestamps)
+
+	def __str__(self):
+		return '\n'.join([str(p) for p in self])
+
+	## Combines two time series value by value.
+	#  This works directly on the columns when both series are columnar,
+	#  and falls back to walking the periods otherwise.
+	#  See AbstractTimeSeries.arithmetic.
+	def arithmetic(self, other, op, how = 'inner'):
+		if not isinstance(other, ColumnarTimeSeries):
+			return super().arithmetic(other, op, how)
+		if self.columns.keys() != other.columns.keys():
+			raise TypeError("Cannot %s incompatible types %s and %s" % (op.__name__, self.__class__.__name__, other.__class__.__name__))
+
+		timestamps, leftIndices, rightIndices = mergeJoin(self.timestamps, other.timestamps, how)
+		series = self._emptyLike()
+		series.timestamps = array.array('q', timestamps)
+		for k, c in self.columns.items():
+			oc = other.columns[k]
+			if how == 'inner':
+				values = [op(c[i], oc[j]) for i, j in zip(leftIndices, rightIndices)]
+			else:
+				values = [op(c[i] if i is not None else NAN, oc[j] if j is not None else NAN)
+					for i, j in zip(leftIndices, rightIndices)]
+			series.columns[k] = _typedArray(c.typecode, values)
+		return series
+
+	## Appends rows in bulk.
+	#  When every row is newer than the series, the columns are extended
+	#  in one step. Otherwise the rows are inserted one by one.
+	#  @param timestamps is a sequence of int64 timestamps, sorted oldest first.
+	#  @param columns is a dictionary of field names to sequences aligned with the timestamps.
+	def extendColumns(self, timestamps, columns):
+		if not timestamps:
+			return
+		if not self.timestamps or timestamps[0] > self.timestamps[-1]:
+			self.timestamps.extend(timestamps)
+			for k, c in self.columns.items():
+				c.extend(columns[k])
+			self.version += 1
+			if self.maxLength is not None or self.maxAge is not None:
+				self._retain()
+		else:
+			for i, t in enumerate(timestamps):
+				self._insert(t, {k : columns[k][i] for k in self.columns})
+
+	## Replaces values of the newest row, such as a bar that is still forming.
+	#  @param values are the fields to replace.
+	def updateNewest(self, **values):
+		if not self.timestamps:
+			raise IndexError("%s is empty" % self.__class__.__name__)
+		for k, v in values.items():
+			self.columns[k][-1] = v
+		self.version += 1
+
+	## Adds a period to the series.
+	def add(self, period):
+		self._insert(toTimestamp(period.timestamp), period.values)
+
+	## Emplaces a period.
+	#  The values go straight into the columns without building a period.
+	def emplace(self, timestamp, **args):
+		self._insert(toTimestamp(timestamp), args)
+
+## Read-only view of part of a time series.
+#  The view holds positions rather than periods, so nothing is copied and
+#  periods are only built when they are accessed.
+#  Like a time series, index 0 is the newest period of the view.
+class TimeSeriesView(object):
+	## Creates a view.
+	#  @param source is a time series, or anything else with a _row method.
+	#  @param positions is a range of positions in the source, counted from
+	#  the oldest, in the order of the view (newest first).
+	def __init__(self, source, positions):
+		self.source = source
+		self.positions = positions
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return TimeSeriesView(self.source, self.positions[index])
+		return self.source._row(self.positions[index])
+
+	def __iter__(self):
+		for position in self.positions:
+			yield self.source._row(position)
+
+	def __reversed__(self):
+		for position in reversed(self.positions):
+			yield self.source._row(position)
+
+	def __len__(self):
+		return len(self.positions)
+
+	def __str__(self):
+		return '\n'.join([str(p) for p in self])
+
 ## Compounds several time series together.
 #  This is for things like MACD and Ichimoku that consist of
 #  several time series together.
 #  Arithematic typically makes no sense for these, so it's
 #  not implemented by default.
+#
+#  The member series can start at different times, so an alignment index
+#  of the timestamps they all share is kept. It is extended as the members
+#  grow, and rebuilt if a member changes in any other way.
 class CompoundTimeSeries(object):
 	## Creates a compound time series.
 	#  @param series is a dictionary of named series to be accessed by __getattr__.
@@ -147,34 +712,115 @@ class CompoundTimeSeries(object):
 		self.series = series
 		self.periodType = periodType
 
+		## Timestamps shared by all members, oldest first.
+		self.timestamps = array.array('q')
+		## For each member, the position of every shared timestamp in it.
+		self.positions = {k : array.array('q') for k in series}
+		## Lengths of the members when the index was last brought up to date.
+		self.lengths = None
+		## Periods evicted from the members when the index was last brought up to date.
+		self.trimmed = None
+
 	def __getattr__(self, key):
-		return self.series[key]
+		# Looked up through __dict__ so that unpickling, which runs before
+		# series is set, does not recurse.
+		try:
+			return self.__dict__['series'][key]
+		except KeyError:
+			raise AttributeError("%s has no series %s" % (self.__class__.__name__, key))
+
+	## Joins the timestamps of the members.
+	#  @param columns is a dictionary of names to (timestamps, offset),
+	#  where offset is added to the positions found.
+	#  @returns the shared timestamps, and the positions in each member.
+	@staticmethod
+	def _join(columns):
+		names = list(columns)
+		timestamps, offset = columns[names[0]]
+		positions = {names[0] : [offset + i for i in range(len(timestamps))]}
+		for name in names[1:]:
+			other, otherOffset = columns[name]
+			timestamps, indices, otherIndices = mergeJoin(timestamps, other)
+			positions = {k : [p[i] for i in indices] for k, p in positions.items()}
+			positions[name] = [otherOffset + j for j in otherIndices]
+		return timestamps, positions
+
+	## Brings the alignment index up to date with the members.
+	def _align(self):
+		lengths = {k : len(v) for k, v in self.series.items()}
+		trimmed = {k : getattr(v, 'trimmed', 0) for k, v in self.series.items()}
+		if lengths == self.lengths and trimmed == self.trimmed:
+			return
+		self.lengths = lengths
+
+		columns = {k : v._timestampColumn() for k, v in self.series.items()}
+		if self.timestamps and trimmed == self.trimmed:
+			# Members that only grew can be joined from the last shared timestamp
+			last = self.timestamps[-1]
+			starts = {k : self.positions[k][-1] + 1 for k in columns}
+			if all(columns[k][starts[k] - 1] == last for k in columns):
+				timestamps, positions = self._join({k : (c[starts[k]:], starts[k]) for k, c in columns.items()})
+				self.timestamps.extend(timestamps)
+				for k, p in positions.items():
+					self.positions[k].extend(p)
+				return
+
+		# Evictions move every position, so the index is rebuilt
+		self.trimmed = trimmed
+		timestamps, positions = self._join({k : (c, 0) for k, c in columns.items()})
+		self.timestamps = array.array('q', timestamps)
+		self.positions = {k : array.array('q', p) for k, p in positions.items()}
+
+	## Builds the compound period at a position in the alignment index.
+	def _row(self, position):
+		return self.periodType(fromTimestamp(self.timestamps[position]),
+			{ k : v._row(self.positions[k][position]) for k, v in self.series.items()})
+
+	## Returns the newest-first index of a timestamp.
+	#  Raises a ValueError if not every member has the timestamp.
+	def index(self, timestamp):
+		self._align()
+		t = toTimestamp(timestamp)
+		i = bisect.bisect_left(self.timestamps, t)
+		if i == len(self.timestamps) or self.timestamps[i] != t:
+			raise ValueError("%s is not in every series" % timestamp)
+		return len(self.timestamps) - 1 - i
 
 	## Gets a period from this time series.
 	#  The 0 index is the latest period.
 	#  Periods can also be fetched by date time.
+	#  Slices return a view across all members, without copying.
 	#  @param index either an int, a datetime, or a slice of either one of those.
 	def __getitem__(self, index):
-		# TODO: Implement int version!
-		# The int version should accgount for offset time series, etc.
-		# It's going to be a little complex.
+		self._align()
+		length = len(self.timestamps)
 		if isinstance(index, datetime.datetime):
-			return self.periodType(index, { k : v[index] for k, v in self.series.items()})
+			return self._row(length - 1 - self.index(index))
 		elif isinstance(index, int):
-			raise NotImplementedError("Fetching by type %s not implemented yet." % type(index))
+			if index < 0:
+				index += length
+			if index < 0 or index >= length:
+				raise IndexError("%s index out of range" % self.__class__.__name__)
+			return self._row(length - 1 - index)
 		elif isinstance(index, slice):
-			if isinstance(index.start, int):
-				raise NotImplementedError("Fetching by type %s not implemented yet." % type(index))
-			elif isinstance(index.start, datetime.datetime):
-				# TODO: This is not yet implemented, just loops back to not implemented error.
-				indexStart = self.periods.index(index.start) if index.start is not None else None
-				indexStop = self.periods.index(index.stop) if index.stop is not None else None
-				return self.__getitem__(slice(indexStart, indexStop))
+			if isinstance(index.start, datetime.datetime) or isinstance(index.stop, datetime.datetime):
+				indexStart = self.index(index.start) if index.start is not None else None
+				indexStop = self.index(index.stop) if index.stop is not None else None
+				index = slice(indexStart, indexStop, index.step)
+			return TimeSeriesView(self, range(length - 1, -1, -1)[index])
 		else:
 			raise TypeError("Cannot fetch item from %s with key type %s" % (self.__class__, type(index)))
 
+	def __len__(self):
+		self._align()
+		return len(self.timestamps)
+
+	def __iter__(self):
+		self._align()
+		for position in range(len(self.timestamps) - 1, -1, -1):
+			yield self._row(position)
+
 	def __str__(self):
-		# TODO: Broken for some fuckin' reason
 		return '\n'.join([
 			'\n'.join([
 					str(p) for p in self.series[k]
@@ -185,14 +831,14 @@ class CompoundTimeSeries(object):
 # OHLVC periods and time series
 
 ## OHLCV Periods
-class PricePeriod(AbstractPeriod):
-	def __init__(self, timestamp, open, high, low, close, volume):
-		super().__init__(timestamp, {'open' : open, 'high' : high, 'low' : low, 'close' : close, 'volume' : volume})
+PricePeriod = definePeriod('PricePeriod', ('open', 'high', 'low', 'close', 'volume'))
 
 ## OHLCV Series
-class PriceTimeSeries(AbstractTimeSeries):
+class PriceTimeSeries(ColumnarTimeSeries):
 	def __init__(self, periods = None):
-		super().__init__(periodType = PricePeriod, periods = periods)
+		super().__init__(periodType = PricePeriod,
+			columns = {'open' : 'd', 'high' : 'd', 'low' : 'd', 'close' : 'd', 'volume' : 'q'},
+			periods = periods)
 
 # Enums
 
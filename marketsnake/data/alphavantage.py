@@ -3,17 +3,87 @@
 #  TODO: Make a generic API class that this inherits from.
 #  TODO: Make the API used part of the config.
 
+import array
 import configparser
 import urllib.request
 import json
 import datetime
 import marketsnake.core as core
+import marketsnake.metrics as metrics
+import marketsnake.data.cache as cache
+
+## Microseconds in each unit of a timestamp string.
+_DAY = 86400000000
+_HOUR = 3600000000
+_MINUTE = 60000000
+_SECOND = 1000000
+
+## Timestamps of midnight, cached by date string.
+#  Intraday payloads only span a few dates, so this saves most of the work.
+_midnights = {}
+
+## Parses a "%Y-%m-%d %H:%M:%S" or "%Y-%m-%d" string into an int64 timestamp.
+#  This avoids strptime, which is slow, by reading the fixed positions.
+def parseTimestamp(dateString):
+	day = dateString[:10]
+	midnight = _midnights.get(day)
+	if midnight is None:
+		midnight = core.toTimestamp(datetime.datetime(int(day[0:4]), int(day[5:7]), int(day[8:10])))
+		_midnights[day] = midnight
+	if len(dateString) == 10:
+		return midnight
+	return (midnight + int(dateString[11:13]) * _HOUR
+		+ int(dateString[14:16]) * _MINUTE + int(dateString[17:19]) * _SECOND)
+
+## Hook for json that turns bars into tuples as they are parsed.
+#  Each bar becomes (open, high, low, close, volume), and the time series
+#  object becomes a list of (date string, bar) pairs, so that no dictionary
+#  is built per bar.
+def _barHook(pairs):
+	if pairs and pairs[0][0] == '1. open' and len(pairs) == 5:
+		return (float(pairs[0][1]), float(pairs[1][1]), float(pairs[2][1]), float(pairs[3][1]), int(pairs[4][1]))
+	elif pairs and isinstance(pairs[0][1], tuple):
+		return pairs
+
+	values = dict(pairs)
+	if '1. open' in values:
+		# Fields out of the usual order
+		return (float(values['1. open']), float(values['2. high']), float(values['3. low']),
+			float(values['4. close']), int(values['5. volume']))
+	return values
+
+## Builds a price series from (date string, bar) pairs in one bulk load.
+#  The pairs can be in any order, but are expected newest first.
+def seriesFromBars(bars):
+	timestamps = array.array('q', [parseTimestamp(d) for d, _ in bars])
+	order = range(len(bars) - 1, -1, -1)
+	if any(timestamps[i] <= timestamps[i + 1] for i in range(len(timestamps) - 1)):
+		order = sorted(range(len(bars)), key = timestamps.__getitem__)
+		# Keep the first of any duplicate timestamps
+		seen = set()
+		order = [i for i in order if not (timestamps[i] in seen or seen.add(timestamps[i]))]
+
+	series = core.PriceTimeSeries()
+	series.extendColumns(array.array('q', [timestamps[i] for i in order]), {
+		'open'   : array.array('d', [bars[i][1][0] for i in order]),
+		'high'   : array.array('d', [bars[i][1][1] for i in order]),
+		'low'    : array.array('d', [bars[i][1][2] for i in order]),
+		'close'  : array.array('d', [bars[i][1][3] for i in order]),
+		'volume' : array.array('q', [bars[i][1][4] for i in order]),
+	})
+	return series
+
+## Parses an intraday payload from a file object.
+#  @returns a time series.
+def parseIntraday(f, interval):
+	return seriesFromBars(json.load(f, object_pairs_hook = _barHook)["Time Series (%dmin)" % (interval)])
 
 class AlphaVantage(object):
 	"""docstring for AlphaVantage"""
 	def __init__(self, configFile):
 		config = configparser.ConfigParser(interpolation=None)
 		config.read(configFile)
+		self.Config = config
 		APIOpts = config['API']
 		TestingOpts = config['TESTING']
 
@@ -29,34 +99,54 @@ class AlphaVantage(object):
 		#  Format with (symbol, interval period in minutes).
 		self.FuncIntraday = EndpointBase % (ApiKey, IntradayBase)
 
-	def getJson(self, endpoint):
-		with urllib.request.urlopen(endpoint) as req:
-			return json.loads(req.read())
+		## Optional local bar cache.
+		self.Cache = None
+		if config.has_section('CACHE'):
+			CacheOpts = config['CACHE']
+			maxAge = CacheOpts.getint('MAX_AGE_DAYS', fallback = None)
+			self.Cache = cache.BarCache(CacheOpts['DIRECTORY'],
+				maxBars = CacheOpts.getint('MAX_BARS', fallback = None),
+				maxAge = datetime.timedelta(days = maxAge) if maxAge is not None else None)
 
-	def getFile(self, filename):
-		with open(filename, "r") as f:
-			return json.loads(f.read())
+	## Fetches and parses json from an endpoint.
+	#  @param objectPairsHook is optionally passed on to json.
+	def getJson(self, endpoint, objectPairsHook = None):
+		with metrics.timer('fetch_seconds', {'source' : 'api'}):
+			with urllib.request.urlopen(endpoint) as req:
+				return json.load(req, object_pairs_hook = objectPairsHook)
+
+	## Parses json from a file.
+	#  @param objectPairsHook is optionally passed on to json.
+	def getFile(self, filename, objectPairsHook = None):
+		with metrics.timer('fetch_seconds', {'source' : 'file'}):
+			with open(filename, "r") as f:
+				return json.load(f, object_pairs_hook = objectPairsHook)
 
 	## Gets intraday data for a symbol.
 	#  @param symbol is a string of the symbol to get.
 	#  @param interval is an integer minutes for the interval.
 	#  @returns a time series.
 	def Intraday(self, symbol, interval):
-		series = core.PriceTimeSeries()
-
 		if not self.TestMode:
-			json = self.getJson(self.FuncIntraday % (symbol, interval))["Time Series (%dmin)" % (interval)]
+			payload = self.getJson(self.FuncIntraday % (symbol, interval), objectPairsHook = _barHook)
 		else:
-			json = self.getFile(self.TestData)["Time Series (%dmin)" % (interval)]
-
-		for dateString in json:
-			timestamp = datetime.datetime.strptime(dateString, "%Y-%m-%d %H:%M:%S")
-			series.emplace(timestamp,
-						   open   =	float(json[dateString]["1. open"]),
-						   high   =	float(json[dateString]["2. high"]),
-						   low    =	float(json[dateString]["3. low"]),
-						   close  =	float(json[dateString]["4. close"]),
-						   volume =	int(json[dateString]["5. volume"])
-			)
-
-		return series
\ No newline at end of file
+			payload = self.getFile(self.TestData, objectPairsHook = _barHook)
+
+		with metrics.timer('parse_seconds'):
+			series = seriesFromBars(payload["Time Series (%dmin)" % (interval)])
+		metrics.increment('bars_ingested', len(series))
+
+		if self.Cache is not None:
+			with metrics.timer('bar_cache_seconds'):
+				self.Cache.merge(symbol, interval, series)
+
+		return series
+
+	## Gets stored intraday data for a symbol, without calling the API.
+	#  Bars are stored by Intraday when a cache is configured.
+	#  @param start and end optionally limit the range of datetimes, inclusive.
+	#  @returns a time series.
+	def History(self, symbol, interval, start = None, end = None):
+		if self.Cache is None:
+			raise ValueError("No cache is configured")
+		return self.Cache.load(symbol, interval, start, end)
\ No newline at end of file
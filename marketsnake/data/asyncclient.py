@@ -0,0 +1,184 @@
+## Asynchronous AlphaVantage client.
+#  Fetches many symbols at once over persistent connections, while staying
+#  within the API's request quotas.
+
+import asyncio
+import http.client
+import json
+import random
+import time
+import urllib.parse
+import marketsnake.data.alphavantage as alphavantage
+import marketsnake.metrics as metrics
+
+## Raised for responses that are worth retrying, such as server errors
+#  or AlphaVantage's call frequency notes.
+class RetryableError(Exception):
+	pass
+
+## Raised for client errors (HTTP 4xx), which are not retried.
+class ClientError(Exception):
+	pass
+
+## Token bucket rate limiter.
+#  Holds up to capacity tokens, refilled at rate tokens per period seconds.
+class TokenBucket(object):
+	def __init__(self, rate, period, capacity = None, clock = time.monotonic):
+		self.rate = rate / float(period)
+		self.capacity = capacity if capacity is not None else rate
+		self.tokens = float(self.capacity)
+		self.clock = clock
+		self.updated = clock()
+
+	def _refill(self):
+		now = self.clock()
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+
+	## Returns the seconds until a token is available, taking it if there is one.
+	def take(self):
+		self._refill()
+		if self.tokens >= 1:
+			self.tokens -= 1
+			return 0.0
+		return (1 - self.tokens) / self.rate
+
+	## Waits until a token is available, and takes it.
+	async def acquire(self):
+		wait = self.take()
+		while wait > 0:
+			await asyncio.sleep(wait)
+			wait = self.take()
+
+## Pool of persistent HTTP connections, one pool per host.
+#  Connections are used from worker threads, one request at a time. Taking
+#  and returning a connection are single list operations, so several
+#  threads can share the pool.
+class ConnectionPool(object):
+	def __init__(self, timeout = 30):
+		self.timeout = timeout
+		self.idle = {}
+
+	def _connect(self, scheme, netloc):
+		if scheme == 'https':
+			return http.client.HTTPSConnection(netloc, timeout = self.timeout)
+		return http.client.HTTPConnection(netloc, timeout = self.timeout)
+
+	## Performs a GET request, reusing an idle connection if there is one.
+	#  This blocks, so it should be run in a worker thread.
+	#  @returns the response body.
+	def get(self, url):
+		parts = urllib.parse.urlsplit(url)
+		host = (parts.scheme, parts.netloc)
+		path = parts.path + ('?' + parts.query if parts.query else '')
+
+		idle = self.idle.setdefault(host, [])
+		try:
+			connection = idle.pop()
+		except IndexError:
+			# Another thread may have taken the last idle connection
+			connection = self._connect(*host)
+		try:
+			connection.request('GET', path or '/')
+			response = connection.getresponse()
+			body = response.read()
+		except Exception:
+			connection.close()
+			raise
+
+		if response.will_close:
+			connection.close()
+		else:
+			idle.append(connection)
+
+		if response.status == 429 or response.status >= 500:
+			raise RetryableError("HTTP %d from %s" % (response.status, parts.netloc))
+		elif response.status >= 400:
+			raise ClientError("HTTP %d from %s" % (response.status, parts.netloc))
+		return body
+
+	def close(self):
+		for connections in self.idle.values():
+			for connection in connections:
+				connection.close()
+		self.idle = {}
+
+## Asyncio client alongside AlphaVantage.
+#  Uses the same config file, and adds to it:
+#  [API] REQUESTS_PER_MINUTE, REQUESTS_PER_DAY and MAX_CONNECTIONS.
+class AsyncAlphaVantage(object):
+	## Creates the client.
+	#  @param retries is the number of times a failed request is retried.
+	#  @param backoff is the delay in seconds before the first retry, doubled for each one after.
+	def __init__(self, configFile, retries = 3, backoff = 1.0):
+		self.api = alphavantage.AlphaVantage(configFile)
+		APIOpts = self.api.Config['API']
+
+		self.retries = retries
+		self.backoff = backoff
+		self.pool = ConnectionPool()
+
+		## Limits the number of requests in flight.
+		self.connections = asyncio.Semaphore(APIOpts.getint('MAX_CONNECTIONS', fallback = 4))
+
+		## Limits imposed by the provider's quotas.
+		self.buckets = [
+			TokenBucket(APIOpts.getint('REQUESTS_PER_MINUTE', fallback = 5), 60),
+			TokenBucket(APIOpts.getint('REQUESTS_PER_DAY', fallback = 500), 86400),
+		]
+
+	async def __aenter__(self):
+		return self
+
+	async def __aexit__(self, *exc):
+		self.close()
+
+	def close(self):
+		self.pool.close()
+
+	## Fetches and parses json from an endpoint.
+	#  Waits for the rate limiters, and retries with exponential backoff.
+	#  The request and the parsing run in worker threads, off the event loop.
+	#  @param objectPairsHook is optionally passed on to json.
+	async def getJson(self, endpoint, objectPairsHook = None):
+		for attempt in range(self.retries + 1):
+			for bucket in self.buckets:
+				await bucket.acquire()
+			try:
+				async with self.connections:
+					with metrics.timer('fetch_seconds', {'source' : 'async'}):
+						body = await asyncio.to_thread(self.pool.get, endpoint)
+				payload = await asyncio.to_thread(json.loads, body, object_pairs_hook = objectPairsHook)
+				if 'Note' in payload or 'Information' in payload:
+					raise RetryableError(payload.get('Note', payload.get('Information')))
+				return payload
+			except (RetryableError, OSError, http.client.HTTPException) as e:
+				if attempt == self.retries:
+					metrics.increment('fetch_failed')
+					raise
+				metrics.increment('fetch_retries')
+				await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random() * 0.1))
+
+	## Gets intraday data for a symbol.
+	#  See AlphaVantage.Intraday.
+	async def Intraday(self, symbol, interval):
+		if not self.api.TestMode:
+			payload = await self.getJson(self.api.FuncIntraday % (symbol, interval), objectPairsHook = alphavantage._barHook)
+		else:
+			payload = await asyncio.to_thread(self.api.getFile, self.api.TestData, alphavantage._barHook)
+
+		with metrics.timer('parse_seconds'):
+			series = await asyncio.to_thread(alphavantage.seriesFromBars, payload["Time Series (%dmin)" % (interval)])
+		metrics.increment('bars_ingested', len(series))
+
+		if self.api.Cache is not None:
+			with metrics.timer('bar_cache_seconds'):
+				self.api.Cache.merge(symbol, interval, series)
+
+		return series
+
+	## Gets intraday data for several symbols at once.
+	#  @returns a dictionary of symbols to time series.
+	async def IntradayMany(self, symbols, interval):
+		series = await asyncio.gather(*[self.Intraday(symbol, interval) for symbol in symbols])
+		return dict(zip(symbols, series))
\ No newline at end of file
@@ -0,0 +1,216 @@
+## Local bar cache.
+#  Stores price bars on disk per (symbol, interval), so that history can be
+#  read back without calling the API.
+#
+#  Each (symbol, interval) gets a directory holding one file per column.
+#  A column file is a raw array in native byte order (int64 timestamps in
+#  microseconds, doubles for prices, int64 for volume), so the files are
+#  append-only and can be memory-mapped or read with array.fromfile.
+#
+#  Eviction rewrites every column, so it writes them into a new generation
+#  directory and then switches to it by replacing a CURRENT file, which is a
+#  single rename. A crash at any point leaves either the old columns or the
+#  new ones, never a mix of the two.
+
+import array
+import bisect
+import os
+import shutil
+import marketsnake.core as core
+
+## Read-only sequence over a column file, reading one value per access.
+#  This lets the timestamps be bisected without reading the whole file.
+class _ColumnFile(object):
+	def __init__(self, f, typecode, length):
+		self.f = f
+		self.typecode = typecode
+		self.length = length
+
+	def __len__(self):
+		return self.length
+
+	def __getitem__(self, index):
+		if index < 0:
+			index += self.length
+		if index < 0 or index >= self.length:
+			raise IndexError("column index out of range")
+		value = array.array(self.typecode)
+		self.f.seek(index * value.itemsize)
+		value.fromfile(self.f, 1)
+		return value[0]
+
+class BarCache(object):
+	## Columns stored for every bar, and their array typecodes.
+	COLUMNS = (('timestamps', 'q'), ('open', 'd'), ('high', 'd'), ('low', 'd'), ('close', 'd'), ('volume', 'q'))
+
+	## Creates a bar cache.
+	#  @param directory is where the bars are stored.
+	#  @param maxBars is the number of bars to keep per (symbol, interval), or None.
+	#  @param maxAge is a timedelta, bars older than this relative to the newest bar are evicted.
+	#  @param slack is the fraction of bars allowed over the limits before they are evicted.
+	#  Eviction rewrites the files, so it is done in batches rather than per bar.
+	def __init__(self, directory, maxBars = None, maxAge = None, slack = 0.25):
+		self.directory = directory
+		self.maxBars = maxBars
+		self.maxAge = maxAge
+		self.slack = slack
+
+	## Returns the directory used for a (symbol, interval).
+	def path(self, symbol, interval):
+		return os.path.join(self.directory, '%s_%dmin' % (symbol, interval))
+
+	## Returns the directory holding the current column files.
+	#  This is the directory of the (symbol, interval) itself until the
+	#  first eviction, and the generation named by its CURRENT file after.
+	def _generation(self, symbol, interval):
+		path = self.path(symbol, interval)
+		try:
+			with open(os.path.join(path, 'CURRENT')) as f:
+				return os.path.join(path, f.read().strip())
+		except FileNotFoundError:
+			return path
+
+	def _columnFile(self, symbol, interval, name):
+		return os.path.join(self._generation(symbol, interval), name + '.bin')
+
+	## Returns the number of complete bars stored.
+	#  A crash in the middle of an append can leave columns of different
+	#  lengths, in which case the extra values are ignored.
+	def _length(self, symbol, interval):
+		lengths = []
+		for name, typecode in self.COLUMNS:
+			filename = self._columnFile(symbol, interval, name)
+			if not os.path.exists(filename):
+				return 0
+			lengths.append(os.path.getsize(filename) // array.array(typecode).itemsize)
+		return min(lengths)
+
+	## Reads the stored columns.
+	#  @returns a dictionary of column names to arrays, oldest first.
+	def _read(self, symbol, interval):
+		length = self._length(symbol, interval)
+		columns = {}
+		for name, typecode in self.COLUMNS:
+			column = array.array(typecode)
+			if length:
+				with open(self._columnFile(symbol, interval, name), 'rb') as f:
+					column.fromfile(f, length)
+			columns[name] = column
+		return columns
+
+	## Writes columns, replacing what is stored, as a new generation.
+	def _write(self, symbol, interval, columns):
+		path = self.path(symbol, interval)
+		os.makedirs(path, exist_ok = True)
+		current = self._generation(symbol, interval)
+		number = int(os.path.basename(current)[3:]) + 1 if current != path else 1
+		generation = 'gen%d' % number
+
+		# A generation left over from a crash is written again from scratch
+		shutil.rmtree(os.path.join(path, generation), ignore_errors = True)
+		os.makedirs(os.path.join(path, generation))
+		for name, _ in self.COLUMNS:
+			with open(os.path.join(path, generation, name + '.bin'), 'wb') as f:
+				columns[name].tofile(f)
+
+		with open(os.path.join(path, 'CURRENT.tmp'), 'w') as f:
+			f.write(generation)
+		os.replace(os.path.join(path, 'CURRENT.tmp'), os.path.join(path, 'CURRENT'))
+
+		# Drop the columns that were replaced
+		for entry in os.listdir(path):
+			if entry.startswith('gen') and entry != generation:
+				shutil.rmtree(os.path.join(path, entry), ignore_errors = True)
+			elif entry.endswith('.bin'):
+				os.remove(os.path.join(path, entry))
+
+	## Returns the timestamp of the newest stored bar, or None.
+	def lastTimestamp(self, symbol, interval):
+		length = self._length(symbol, interval)
+		if length == 0:
+			return None
+		column = array.array('q')
+		with open(self._columnFile(symbol, interval, 'timestamps'), 'rb') as f:
+			f.seek((length - 1) * column.itemsize)
+			column.fromfile(f, 1)
+		return core.fromTimestamp(column[0])
+
+	## Merges a price series into the cache.
+	#  Only bars newer than the newest stored bar are appended. A bar with
+	#  the same timestamp as the newest stored bar replaces it, since it may
+	#  have been stored while it was still forming.
+	#  @returns the number of bars appended.
+	def merge(self, symbol, interval, series):
+		os.makedirs(self.path(symbol, interval), exist_ok = True)
+		length = self._length(symbol, interval)
+		last = self.lastTimestamp(symbol, interval)
+		start = 0 if last is None else bisect.bisect_left(series.timestamps, core.toTimestamp(last))
+
+		if last is not None and start < len(series.timestamps) and series.timestamps[start] == core.toTimestamp(last):
+			# Rewrite the newest stored bar in place
+			for name, _ in self.COLUMNS:
+				column = series.timestamps if name == 'timestamps' else series.column(name)
+				with open(self._columnFile(symbol, interval, name), 'r+b') as f:
+					f.seek((length - 1) * column.itemsize)
+					column[start:start + 1].tofile(f)
+			start += 1
+
+		for name, typecode in self.COLUMNS:
+			column = series.timestamps if name == 'timestamps' else series.column(name)
+			with open(self._columnFile(symbol, interval, name), 'ab') as f:
+				if length != self._fileLength(f, typecode):
+					# Drop values left over from an interrupted append
+					f.truncate(length * column.itemsize)
+				column[start:].tofile(f)
+
+		appended = len(series.timestamps) - start
+		self.evict(symbol, interval)
+		return appended
+
+	def _fileLength(self, f, typecode):
+		return os.fstat(f.fileno()).st_size // array.array(typecode).itemsize
+
+	## Returns the index of the first bar to keep under the retention limits.
+	def _retentionStart(self, timestamps):
+		start = 0
+		if self.maxBars is not None:
+			start = max(start, len(timestamps) - self.maxBars)
+		if self.maxAge is not None and timestamps:
+			cutoff = timestamps[-1] - self.maxAge // core._MICROSECOND
+			start = max(start, bisect.bisect_left(timestamps, cutoff))
+		return start
+
+	## Evicts bars outside of the retention limits.
+	#  Whether anything is due is decided from the file lengths and a
+	#  bisection of the timestamp file, so the columns are only read when
+	#  they are about to be rewritten.
+	#  @param force compacts even if the bars over the limits are within the slack.
+	#  @returns the number of bars evicted.
+	def evict(self, symbol, interval, force = False):
+		if self.maxBars is None and self.maxAge is None:
+			return 0
+		length = self._length(symbol, interval)
+		if length == 0:
+			return 0
+		with open(self._columnFile(symbol, interval, 'timestamps'), 'rb') as f:
+			start = self._retentionStart(_ColumnFile(f, 'q', length))
+		if start == 0 or (not force and start < self.slack * (length - start)):
+			return 0
+
+		columns = self._read(symbol, interval)
+		self._write(symbol, interval, {k : c[start:] for k, c in columns.items()})
+		return start
+
+	## Loads stored bars, without any network call.
+	#  @param start and end optionally limit the bars to a range of datetimes, inclusive.
+	#  @returns a PriceTimeSeries.
+	def load(self, symbol, interval, start = None, end = None):
+		columns = self._read(symbol, interval)
+		timestamps = columns.pop('timestamps')
+
+		first = bisect.bisect_left(timestamps, core.toTimestamp(start)) if start is not None else 0
+		last = bisect.bisect_right(timestamps, core.toTimestamp(end)) if end is not None else len(timestamps)
+
+		series = core.PriceTimeSeries()
+		series.extendColumns(timestamps[first:last], {k : c[first:last] for k, c in columns.items()})
+		return series
\ No newline at end of file
@@ -0,0 +1,102 @@
+## Resampling of price series into coarser bars.
+#  One fetch at a fine interval can feed every coarser interval,
+#  such as 1 -> 5 -> 15 -> 60 minutes, or daily.
+
+import array
+import marketsnake.core as core
+
+## Interval for daily bars, in minutes.
+DAILY = 1440
+
+_MINUTE = 60 * 1000000
+_DAY = DAILY * _MINUTE
+
+## Returns the timestamp of the coarse bar a timestamp falls in.
+#  Bars never span two days, so each session starts a new bar. Fine bars
+#  before the first anchored bar of their day go into a bar starting at
+#  midnight, rather than into one labelled the day before.
+#  @param step is the interval in microseconds.
+#  @param offset is where the bars are anchored, in microseconds after midnight.
+def _bucket(t, step, offset):
+	midnight = t - t % _DAY
+	if step >= _DAY:
+		return midnight
+	return max(midnight, midnight + offset + (t - midnight - offset) // step * step)
+
+## Resamples a price series into coarser bars.
+#  Each coarse bar takes the first open, the highest high, the lowest low,
+#  the last close and the total volume of the bars in it. Coarse bars are
+#  labelled with their start time, and gaps produce no bars.
+#  @param interval is the coarse interval in minutes, or DAILY.
+#  @param offset is the number of minutes after midnight the bars are anchored
+#  to, such as 570 to start hourly bars at 9:30.
+#  @returns a PriceTimeSeries.
+def resample(priceSeries, interval, offset = 0):
+	step, offsetMicroseconds = interval * _MINUTE, offset * _MINUTE
+	timestamps = priceSeries.timestamps
+	buckets = [_bucket(t, step, offsetMicroseconds) for t in timestamps]
+
+	# The rows where each coarse bar starts, and one past the end
+	starts = [i for i in range(len(buckets)) if i == 0 or buckets[i] != buckets[i - 1]]
+	ends = starts[1:] + [len(buckets)]
+
+	opens, highs, lows = priceSeries.column('open'), priceSeries.column('high'), priceSeries.column('low')
+	closes, volumes = priceSeries.column('close'), priceSeries.column('volume')
+
+	series = core.PriceTimeSeries()
+	series.extendColumns(array.array('q', [buckets[i] for i in starts]), {
+		'open'   : array.array('d', [opens[i] for i in starts]),
+		'high'   : array.array('d', [max(highs[i:j]) for i, j in zip(starts, ends)]),
+		'low'    : array.array('d', [min(lows[i:j]) for i, j in zip(starts, ends)]),
+		'close'  : array.array('d', [closes[j - 1] for j in ends]),
+		'volume' : array.array('q', [sum(volumes[i:j]) for i, j in zip(starts, ends)]),
+	})
+	return series
+
+## Incremental resampler.
+#  Keeps a coarse series up to date as fine bars arrive. The newest coarse
+#  bar is updated in place until a fine bar from the next one arrives.
+class Resampler(object):
+	## Creates a resampler.
+	#  See resample for interval and offset.
+	def __init__(self, interval, offset = 0):
+		self.interval = interval
+		self.offset = offset
+		self.step = interval * _MINUTE
+		self.offsetMicroseconds = offset * _MINUTE
+
+		## The coarse bars.
+		self.series = core.PriceTimeSeries()
+		## Timestamp of the last fine bar, in microseconds.
+		self.lastTimestamp = None
+
+	## Adds a fine bar.
+	#  Bars that are not newer than the last one are ignored.
+	#  @returns whether or not a new coarse bar was started.
+	def update(self, period):
+		t = core.toTimestamp(period.timestamp)
+		if self.lastTimestamp is not None and t <= self.lastTimestamp:
+			return False
+		self.lastTimestamp = t
+
+		bucket = _bucket(t, self.step, self.offsetMicroseconds)
+		series = self.series
+		if series.timestamps and series.timestamps[-1] == bucket:
+			series.updateNewest(
+				high = max(series.columns['high'][-1], period.high),
+				low = min(series.columns['low'][-1], period.low),
+				close = period.close,
+				volume = series.columns['volume'][-1] + period.volume)
+			return False
+
+		series.extendColumns(array.array('q', [bucket]), {
+			'open' : [period.open], 'high' : [period.high], 'low' : [period.low],
+			'close' : [period.close], 'volume' : [period.volume]})
+		return True
+
+	## Adds several fine bars.
+	#  @param periods is a time series, a view or a list of periods, in either
+	#  order, or an iterable of periods oldest first. See core.oldestFirst.
+	def extend(self, periods):
+		for p in core.oldestFirst(periods):
+			self.update(p)
\ No newline at end of file
@@ -1,25 +1,127 @@
+import bisect
 import marketsnake.events.event as event
 import marketsnake.core as core
+import marketsnake.metrics as metrics
 from marketsnake.core import Direction
 
-class CrossoverPeriod(core.AbstractPeriod):
-	def __init__(self, timestamp, dir):
-		super().__init__(timestamp, {'dir' : dir})
+CrossoverPeriod = core.definePeriod('CrossoverPeriod', ('dir',))
+
+## Finds where a sequence of values changes sign.
+#  Values above 0 are positive, and values of 0 or below are negative.
+#  @param values should be oldest first.
+#  @returns a list of (index, direction) for every change of sign.
+def signChanges(values):
+	signs = [v > 0 for v in values]
+	return [(i, Direction.UP if sign else Direction.DOWN)
+		for i, (last, sign) in enumerate(zip(signs, signs[1:]), 1) if sign is not last]
 
 class CrossoverEvent(event.Event, core.AbstractTimeSeries):
-	def __init__(self, base, signal, alert = None, key = lambda p: p.ema):
+	## Finds the crossovers of signal over base.
+	#  @param key optionally takes the value from a period of signal - base.
+	#  Otherwise, the field column is read directly.
+	#  @param field is the field to compare, if no key is given.
+	@metrics.timed('event_seconds', {'event' : 'crossover'})
+	def __init__(self, base, signal, alert = None, key = None, field = 'ema'):
 		# TODO: Figure out a way to do this...
 		#super().__init__(alert = alert)
 		#super().__init__(periodType = CrossoverPeriod)
 		event.Event.__init__(self, alert = alert)
 		core.AbstractTimeSeries.__init__(self, periodType = CrossoverPeriod)
 
+		self.base = base
+		self.signal = signal
 		self.key = key
+		self.field = field
 		self.delta = signal - base
-		
-		lastSign = key(self.delta[-1]) > 0 # True: Positive, False: Negative or 0
-		for p in reversed(self.delta):
-			pSign = key(p) > 0
-			if pSign is not lastSign:
-				self.emplace(p.timestamp, dir = Direction.UP if pSign is True else Direction.DOWN)
-			lastSign = pSign
\ No newline at end of file
+
+		if key is None and isinstance(self.delta, core.ColumnarTimeSeries):
+			# Only the timestamps of the crossovers are turned into datetimes
+			values = self.delta.column(field)
+			timestamps = self.delta.timestamps
+			toDatetime = core.fromTimestamp
+		else:
+			key = key or (lambda p: getattr(p, field))
+			periods = list(reversed(self.delta))
+			values = [key(p) for p in periods]
+			timestamps = [p.timestamp for p in periods]
+			toDatetime = lambda t: t
+
+		for i, dir in signChanges(values):
+			self.emplace(toDatetime(timestamps[i]), dir = dir)
+
+		## Sign of the newest delta, True if positive.
+		self.lastSign = values[-1] > 0 if len(values) else None
+		## Timestamp of the newest delta checked.
+		self.lastTimestamp = toDatetime(timestamps[-1]) if len(values) else None
+
+	## Creates a crossover event from crossovers that were already found.
+	#  The deltas are not checked again, so this costs O(crossovers).
+	#  @param timestamps and dirs are arrays of int64 timestamps and Direction values, oldest first.
+	#  @param delta is signal - base, as it was when the crossovers were found.
+	#  @param lastSign and lastTimestamp are the state used by update.
+	@classmethod
+	def fromColumns(cls, base, signal, delta, timestamps, dirs, lastSign, lastTimestamp, alert = None, field = 'ema'):
+		crossover = cls.__new__(cls)
+		event.Event.__init__(crossover, alert = alert)
+		core.AbstractTimeSeries.__init__(crossover, periodType = CrossoverPeriod)
+
+		crossover.base = base
+		crossover.signal = signal
+		crossover.key = None
+		crossover.field = field
+		crossover.delta = delta
+		for t, dir in zip(timestamps, dirs):
+			crossover.emplace(core.fromTimestamp(t), dir = Direction(dir))
+
+		crossover.lastSign = lastSign
+		crossover.lastTimestamp = lastTimestamp
+		return crossover
+
+	## Returns the new deltas, oldest first, as (timestamp, value, period).
+	#  Only the timestamps newer than the last one checked are looked at.
+	#  The period of signal - base is only built with a key or for series
+	#  that are not columnar, and is None otherwise.
+	def _newDeltas(self):
+		if self.key is not None or not isinstance(self.delta, core.ColumnarTimeSeries):
+			key = self.key or (lambda p: getattr(p, self.field))
+			newer = lambda s: [s._row(i) for i in range(
+				s._countOlder(self.lastTimestamp, inclusive = True) if self.lastTimestamp is not None else 0, len(s))]
+			basePeriods, signalPeriods = newer(self.base), newer(self.signal)
+			timestamps, baseIndices, signalIndices = core.mergeJoin(
+				[p.timestamp for p in basePeriods], [p.timestamp for p in signalPeriods])
+			deltas = [signalPeriods[j] - basePeriods[i] for i, j in zip(baseIndices, signalIndices)]
+			return [(t, key(p), p) for t, p in zip(timestamps, deltas)]
+
+		last = core.toTimestamp(self.lastTimestamp) if self.lastTimestamp is not None else None
+		start = lambda s: bisect.bisect_right(s.timestamps, last) if last is not None else 0
+		baseStart, signalStart = start(self.base), start(self.signal)
+		timestamps, baseIndices, signalIndices = core.mergeJoin(
+			self.base.timestamps[baseStart:], self.signal.timestamps[signalStart:])
+
+		baseColumn, signalColumn = self.base.column(self.field), self.signal.column(self.field)
+		return [(core.fromTimestamp(t), signalColumn[signalStart + j] - baseColumn[baseStart + i], None)
+			for t, i, j in zip(timestamps, baseIndices, signalIndices)]
+
+	## Checks the bars added to base and signal since the last check.
+	#  Usually this is just the newest bar, so this costs O(1) per bar.
+	#  Every new crossover is broadcast.
+	#  @returns a list of the new crossover periods.
+	@metrics.timed('event_seconds', {'event' : 'crossover'})
+	def update(self):
+		found = []
+		for timestamp, value, delta in self._newDeltas():
+			if delta is not None:
+				self.delta.add(delta)
+			else:
+				self.delta.emplace(timestamp, **{self.field : value})
+
+			sign = value > 0
+			if self.lastSign is not None and sign is not self.lastSign:
+				period = CrossoverPeriod(timestamp, Direction.UP if sign else Direction.DOWN)
+				self.add(period)
+				found.append(period)
+				self.broadcast(str(period))
+			self.lastSign = sign
+			self.lastTimestamp = timestamp
+		metrics.increment('events_found', len(found), {'event' : 'crossover'})
+		return found
\ No newline at end of file
@@ -2,6 +2,8 @@ class Event(object):
 	def __init__(self, alert = None):
 		self.alert = alert
 
-	def broadcast(self):
+	## Sends the alert, if there is one.
+	#  @param args are passed on to the alert, such as the body of an email.
+	def broadcast(self, *args):
 		if self.alert is not None:
-			self.alert()
\ No newline at end of file
+			self.alert(*args)
\ No newline at end of file
@@ -0,0 +1,176 @@
+## Threshold rules.
+#  Rules such as "AAPL close crosses above 230" are indexed by symbol, field
+#  and level, so that each move of a value only looks at the rules it
+#  triggers: O(log n + k) for n rules and k triggered, rather than O(n).
+#
+#  A value is above a level when it is greater than it. A value crosses up
+#  through a level when it goes from not above to above, and down when it
+#  goes from above to not above.
+
+import itertools
+import math
+import sortedcontainers as sc
+import marketsnake.events.event as event
+import marketsnake.metrics as metrics
+from marketsnake.core import Direction
+
+## Rule that fires when a field crosses a level.
+class ThresholdRule(event.Event):
+	## Creates a rule.
+	#  @param direction is Direction.UP, Direction.DOWN, or None for both.
+	def __init__(self, symbol, field, level, direction = Direction.UP, alert = None):
+		super().__init__(alert = alert)
+		self.symbol = symbol
+		self.field = field
+		self.level = level
+		self.direction = direction
+
+	## Returns the (level, direction, tag) of the crossings the rule listens to.
+	def _edges(self):
+		directions = [self.direction] if self.direction is not None else [Direction.UP, Direction.DOWN]
+		return [(self.level, d, None) for d in directions]
+
+	## Returns whether or not a crossing of an edge triggers the rule.
+	def _accepts(self, tag, previous, current):
+		return True
+
+	def describe(self, timestamp, value, direction):
+		return "%s %s %s crossed %s %s at %s" % (self.symbol, self.field, value,
+			'above' if direction is Direction.UP else 'below', self.level, timestamp)
+
+## Rule that fires when a field enters or leaves a band.
+#  The band holds the values above low and not above high.
+#  The rule is indexed as its two edges, so it costs the same as two thresholds.
+class BandRule(event.Event):
+	## Creates a rule.
+	#  @param enter fires on entering the band if True, and on leaving it otherwise.
+	def __init__(self, symbol, field, low, high, enter = True, alert = None):
+		if low >= high:
+			raise ValueError("The low of a band must be below its high")
+		super().__init__(alert = alert)
+		self.symbol = symbol
+		self.field = field
+		self.low = low
+		self.high = high
+		self.enter = enter
+
+	def _edges(self):
+		if self.enter:
+			return [(self.low, Direction.UP, 'low'), (self.high, Direction.DOWN, 'high')]
+		return [(self.low, Direction.DOWN, 'low'), (self.high, Direction.UP, 'high')]
+
+	def _accepts(self, tag, previous, current):
+		# A move can cross one edge and jump over the band entirely
+		if self.enter:
+			return current <= self.high if tag == 'low' else current > self.low
+		return previous <= self.high if tag == 'low' else previous > self.low
+
+	def describe(self, timestamp, value, direction):
+		return "%s %s %s %s %s to %s at %s" % (self.symbol, self.field, value,
+			'entered' if self.enter else 'left', self.low, self.high, timestamp)
+
+## Index of the rules of one field of one symbol.
+class _FieldIndex(object):
+	def __init__(self):
+		## Edges of the rules by direction, as sorted (level, sequence, rule, tag).
+		self.edges = {Direction.UP : sc.SortedList(), Direction.DOWN : sc.SortedList()}
+		## The last value seen, or None.
+		self.last = None
+
+	def __len__(self):
+		return len(self.edges[Direction.UP]) + len(self.edges[Direction.DOWN])
+
+	## Returns the rules triggered by a move, with the direction of each crossing.
+	def crossings(self, previous, current):
+		if current > previous:
+			direction, low, high = Direction.UP, previous, current
+		elif current < previous:
+			direction, low, high = Direction.DOWN, current, previous
+		else:
+			return []
+
+		# Up crossings are the levels in [previous, current), and down crossings those in [current, previous)
+		edges = self.edges[direction].irange((low,), (high,), inclusive = (True, False))
+		return [(rule, direction) for _, _, rule, tag in edges if rule._accepts(tag, previous, current)]
+
+## Engine checking many threshold and band rules.
+#  Values are fed in by symbol and field, either one by one or as periods,
+#  and every triggered rule broadcasts through its alert.
+class ThresholdEngine(object):
+	def __init__(self):
+		## Field indices by (symbol, field).
+		self.indices = {}
+		## Fields with rules, by symbol.
+		self.fields = {}
+		## Edges added for each rule, so that it can be removed.
+		self.entries = {}
+		self.sequence = itertools.count()
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __contains__(self, rule):
+		return id(rule) in self.entries
+
+	## Adds a rule.
+	def add(self, rule):
+		if id(rule) in self.entries:
+			return
+		index = self.indices.get((rule.symbol, rule.field))
+		if index is None:
+			index = self.indices[(rule.symbol, rule.field)] = _FieldIndex()
+			self.fields.setdefault(rule.symbol, set()).add(rule.field)
+
+		entries = []
+		for level, direction, tag in rule._edges():
+			entry = (level, next(self.sequence), rule, tag)
+			index.edges[direction].add(entry)
+			entries.append((direction, entry))
+		self.entries[id(rule)] = entries
+
+	## Removes a rule.
+	#  Raises a KeyError if the rule was not added.
+	def remove(self, rule):
+		entries = self.entries.pop(id(rule))
+		index = self.indices[(rule.symbol, rule.field)]
+		for direction, entry in entries:
+			index.edges[direction].remove(entry)
+		if not len(index):
+			del self.indices[(rule.symbol, rule.field)]
+			self.fields[rule.symbol].discard(rule.field)
+			if not self.fields[rule.symbol]:
+				del self.fields[rule.symbol]
+
+	## Checks a move of a field from one value to another.
+	#  The last value seen is not changed.
+	#  @returns a list of the (rule, direction) triggered, after broadcasting them.
+	def move(self, symbol, field, previous, current, timestamp = None):
+		index = self.indices.get((symbol, field))
+		if index is None:
+			return []
+		triggered = index.crossings(previous, current)
+		for rule, direction in triggered:
+			rule.broadcast(rule.describe(timestamp, current, direction))
+		return triggered
+
+	## Checks a new value of a field against the last one seen.
+	#  NaN values are skipped.
+	#  @returns a list of the (rule, direction) triggered.
+	def updateValue(self, symbol, field, value, timestamp = None):
+		index = self.indices.get((symbol, field))
+		if index is None or math.isnan(value):
+			return []
+		previous, index.last = index.last, value
+		if previous is None:
+			return []
+		return self.move(symbol, field, previous, value, timestamp)
+
+	## Checks every field with rules for a symbol against a new period.
+	#  @returns a list of the (rule, direction) triggered.
+	@metrics.timed('event_seconds', {'event' : 'threshold'})
+	def update(self, symbol, period):
+		triggered = []
+		for field in self.fields.get(symbol, ()):
+			triggered.extend(self.updateValue(symbol, field, getattr(period, field), period.timestamp))
+		metrics.increment('events_found', len(triggered), {'event' : 'threshold'})
+		return triggered
\ No newline at end of file
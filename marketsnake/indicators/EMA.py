@@ -1,34 +1,128 @@
+import array
+import operator
 import marketsnake.core as core
+import marketsnake.metrics as metrics
 
-class EMAPeriod(core.AbstractPeriod):
-	def __init__(self, timestamp, ema):
-		super().__init__(timestamp, {'ema': ema})
+EMAPeriod = core.definePeriod('EMAPeriod', ('ema',))
 
-class EMATimeSeries(core.AbstractTimeSeries):
-	def __init__(self, period = None, periods = None):
-		super().__init__(periodType = EMAPeriod, periods = periods)
+class EMATimeSeries(core.ColumnarTimeSeries):
+	## Creates an EMA series.
+	#  @param key is used by update to take a value from a period.
+	def __init__(self, period = None, periods = None, key = operator.attrgetter('close')):
+		super().__init__(periodType = EMAPeriod, columns = {'ema' : 'd'}, periods = periods)
 		self.period = period
+		self.key = key
+		self._resetState()
+
+	## Clears the running state used by update.
+	def _resetState(self):
+		## Values collected before there are enough to seed the EMA.
+		self.warmup = []
+		## The latest EMA value, or None before the EMA is seeded.
+		self.ema = None
+		## Timestamp of the last period passed to update.
+		self.lastTimestamp = None
+
+	def _emptyLike(self):
+		series = super()._emptyLike()
+		series._resetState()
+		return series
+
+	## Returns an empty EMA series that carries on from the running state of this one.
+	#  It updates exactly like this series would, but holds none of its periods.
+	def copyState(self):
+		series = self._emptyLike()
+		series.warmup = list(self.warmup)
+		series.ema = self.ema
+		series.lastTimestamp = self.lastTimestamp
+		return series
+
+	## Advances the EMA by one value.
+	#  Values that are not newer than the last one are ignored.
+	#  @returns the new EMA value, or None if nothing was added.
+	def updateValue(self, timestamp, value):
+		if self.lastTimestamp is not None and timestamp <= self.lastTimestamp:
+			return None
+		self.lastTimestamp = timestamp
+
+		if self.ema is None:
+			self.warmup.append(value)
+			if len(self.warmup) < self.period:
+				return None
+
+			# The initial EMA is the SMA of the first values
+			self.ema = sum(reversed(self.warmup))/float(self.period)
+			self.warmup = []
+		else:
+			self.ema = (value - self.ema)*(2.0 / (self.period + 1.0)) + self.ema
+
+		self.emplace(timestamp, ema = self.ema)
+		return self.ema
+
+	## Advances the EMA by one period, using the key of this series.
+	#  This costs O(1), regardless of the length of the series.
+	def update(self, newPeriod):
+		return self.updateValue(newPeriod.timestamp, self.key(newPeriod))
+
+	## Advances the EMA by several periods.
+	#  @param periods is a time series or a list of periods, in either order,
+	#  or an iterable of periods oldest first. See core.oldestFirst.
+	def extend(self, periods):
+		for p in core.oldestFirst(periods):
+			self.update(p)
+
+	## Runs the EMA over a column of values, from an empty running state.
+	#  This is the same recurrence as updateValue, without building a period
+	#  for every value.
+	#  @param timestamps and values are arrays of int64 timestamps and values, oldest first.
+	def _extendColumn(self, timestamps, values):
+		ema, warmup, mult = self.ema, self.warmup, 2.0 / (self.period + 1.0)
+		emas, first = array.array('d'), None
+		for i, value in enumerate(values):
+			if ema is None:
+				warmup.append(value)
+				if len(warmup) < self.period:
+					continue
+				ema = sum(reversed(warmup))/float(self.period)
+				warmup, first = [], i
+			else:
+				ema = (value - ema)*mult + ema
+			emas.append(ema)
+
+		if first is not None:
+			self.extendColumns(timestamps[first:], {'ema' : emas})
+		self.ema, self.warmup = ema, warmup
+		if len(timestamps):
+			self.lastTimestamp = core.fromTimestamp(timestamps[-1])
+
+	## Creates an EMA series from values that were already computed.
+	#  The running state is restored from them, so the series can be updated.
+	#  @param timestamps and emas are arrays of int64 timestamps and EMA values, oldest first.
+	#  @param lastTimestamp is the datetime of the last value passed in, by default the last timestamp.
+	#  @param warmup is the list of values collected so far, if there are no EMA values yet.
+	#  @param ema is the latest EMA value, by default the last of emas.
+	@classmethod
+	def fromColumn(cls, period, timestamps, emas, key = operator.attrgetter('close'), lastTimestamp = None, warmup = None, ema = None):
+		emaSeries = cls(period, key = key)
+		emaSeries.extendColumns(timestamps, {'ema' : emas})
+		if ema is None and len(emas):
+			ema = emas[-1]
+		emaSeries.ema = ema
+		if ema is None:
+			emaSeries.warmup = list(warmup or [])
+		if lastTimestamp is None and len(timestamps):
+			lastTimestamp = core.fromTimestamp(timestamps[-1])
+		emaSeries.lastTimestamp = lastTimestamp
+		return emaSeries
 
 	@classmethod
-	def fromTimeSeries(cls, priceSeries, period, key = lambda p: p.close):
-		emaSeries = cls(period)
-
-		# The number of periods we will have
-		length = len(priceSeries) - period + 1
-
-		# Calculate the initial SMA
-		emaSeries.emplace(priceSeries[length - 1].timestamp,
-			ema = sum([key(i) for i in priceSeries[length - 1:]])/float(period)
-		)
-
-		# Calculating multiplier
-		mult = 2.0 / (period + 1.0)
-
-		# Calculating EMA for remaining periods
-		for i in range(length - 2, -1, -1):
-			# emaSeries[0] will be the newest calculed period (the previous period)
-			emaSeries.emplace(priceSeries[i].timestamp,
-				ema = (key(priceSeries[i]) - emaSeries[0].ema)*mult + emaSeries[0].ema
-			)
-		
+	@metrics.timed('indicator_seconds', {'indicator' : 'EMA'})
+	def fromTimeSeries(cls, priceSeries, period, key = operator.attrgetter('close')):
+		emaSeries = cls(period, key = key)
+		column = core.keyColumn(priceSeries, key)
+		if column is not None:
+			emaSeries._extendColumn(priceSeries.timestamps, priceSeries.column(column))
+		else:
+			emaSeries.extend(priceSeries)
+		metrics.increment('indicators_computed', labels = {'indicator' : 'EMA'})
 		return emaSeries
\ No newline at end of file
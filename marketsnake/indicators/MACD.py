@@ -1,16 +1,81 @@
+import array
+import operator
 import marketsnake.core as core
+import marketsnake.metrics as metrics
 import marketsnake.indicators.EMA as EMA
 
 class MACDTimeSeries(core.CompoundTimeSeries):
-	def __init__(self, base, signal):
+	## Creates a MACD series.
+	#  @param emaLong and emaShort are the EMAs the base is taken from.
+	#  They are only needed for update.
+	def __init__(self, base, signal, emaLong = None, emaShort = None):
 		super().__init__({'base':base, 'signal':signal})
+		self.emaLong = emaLong
+		self.emaShort = emaShort
+
+	## Advances the MACD by one period.
+	#  Both EMAs, the base and the signal are updated in O(1).
+	#  @returns the new signal value, or None if there is none yet.
+	def update(self, newPeriod):
+		emaLong = self.emaLong.update(newPeriod)
+		emaShort = self.emaShort.update(newPeriod)
+		if emaLong is None or emaShort is None:
+			return None
+
+		base = emaShort - emaLong
+		self.base.emplace(newPeriod.timestamp, ema = base)
+		return self.signal.updateValue(newPeriod.timestamp, base)
+
+	## Advances the MACD by several periods.
+	#  @param periods is a time series or a list of periods, in either order,
+	#  or an iterable of periods oldest first. See core.oldestFirst.
+	def extend(self, periods):
+		for p in core.oldestFirst(periods):
+			self.update(p)
+
+	## Runs the MACD over a column of values, from an empty running state.
+	#  The EMAs are run over the column, and the base is taken from their
+	#  columns, exactly as update would, without building a period for every value.
+	#  @param timestamps and values are arrays of int64 timestamps and values, oldest first.
+	def _extendColumn(self, timestamps, values):
+		self.emaLong._extendColumn(timestamps, values)
+		self.emaShort._extendColumn(timestamps, values)
+		emaLong, emaShort = self.emaLong.column('ema'), self.emaShort.column('ema')
+		longStart, shortStart = len(timestamps) - len(emaLong), len(timestamps) - len(emaShort)
+		start = max(longStart, shortStart)
+
+		bases = array.array('d', [emaShort[i - shortStart] - emaLong[i - longStart] for i in range(start, len(timestamps))])
+		self.base.extendColumns(timestamps[start:], {'ema' : bases})
+		self.signal._extendColumn(timestamps[start:], bases)
 
 	@classmethod
-	def fromTimeSeries(cls, timeSeries, longPeriod = 26, shortPeriod = 12, signalPeriod = 9, key = lambda p: p.close):
-		emaLong  = EMA.EMATimeSeries.fromTimeSeries(timeSeries, longPeriod,  key = key)
-		emaShort = EMA.EMATimeSeries.fromTimeSeries(timeSeries, shortPeriod, key = key)
-		baseSeries = emaShort - emaLong
+	@metrics.timed('indicator_seconds', {'indicator' : 'MACD'})
+	def fromTimeSeries(cls, timeSeries, longPeriod = 26, shortPeriod = 12, signalPeriod = 9, key = operator.attrgetter('close')):
+		macd = cls(EMA.EMATimeSeries(),
+			EMA.EMATimeSeries(signalPeriod, key = operator.attrgetter('ema')),
+			EMA.EMATimeSeries(longPeriod, key = key),
+			EMA.EMATimeSeries(shortPeriod, key = key))
+		column = core.keyColumn(timeSeries, key)
+		if column is not None:
+			macd._extendColumn(timeSeries.timestamps, timeSeries.column(column))
+		else:
+			macd.extend(timeSeries)
+		metrics.increment('indicators_computed', labels = {'indicator' : 'MACD'})
+		return macd
 
-		signalSeries = EMA.EMATimeSeries.fromTimeSeries(baseSeries, signalPeriod, key = lambda p: p.ema)
+	## Creates a MACD from EMAs that were already computed.
+	#  Only the running state of the EMAs is copied for streaming updates, so
+	#  the originals can be shared, and emaLong and emaShort of the MACD only
+	#  hold the periods passed to update.
+	@classmethod
+	def fromEMAs(cls, emaLong, emaShort, signalPeriod = 9):
+		baseSeries = emaShort - emaLong
+		signalSeries = EMA.EMATimeSeries.fromTimeSeries(baseSeries, signalPeriod, key = operator.attrgetter('ema'))
+		return cls(baseSeries, signalSeries, emaLong.copyState(), emaShort.copyState())
 
-		return cls(baseSeries, signalSeries)
\ No newline at end of file
+	## Creates a MACD, sharing its EMAs through an IndicatorCache.
+	@classmethod
+	def fromCache(cls, cache, timeSeries, key = 'close', longPeriod = 26, shortPeriod = 12, signalPeriod = 9):
+		emaLong = cache.get(EMA.EMATimeSeries, timeSeries, key, period = longPeriod)
+		emaShort = cache.get(EMA.EMATimeSeries, timeSeries, key, period = shortPeriod)
+		return cls.fromEMAs(emaLong, emaShort, signalPeriod)
\ No newline at end of file
@@ -1,23 +1,132 @@
+import array
+import collections
+import operator
 import marketsnake.core as core
+import marketsnake.metrics as metrics
 
-class SMAPeriod(core.AbstractPeriod):
-	def __init__(self, timestamp, sma):
-		super().__init__(timestamp, {'sma': sma})
+## Rolling sum using Neumaier compensated summation.
+#  Values leave the window by adding their negation, and the compensation
+#  term keeps long series from drifting.
+class RollingSum(object):
+	def __init__(self):
+		self.total = 0.0
+		self.compensation = 0.0
 
-class SMATimeSeries(core.AbstractTimeSeries):
-	def __init__(self, period = None, periods = None):
-		super().__init__(periodType = SMAPeriod, periods = periods)
+	def add(self, value):
+		total = self.total + value
+		if abs(self.total) >= abs(value):
+			self.compensation += (self.total - total) + value
+		else:
+			self.compensation += (value - total) + self.total
+		self.total = total
+
+	def value(self):
+		return self.total + self.compensation
+
+SMAPeriod = core.definePeriod('SMAPeriod', ('sma',))
+
+class SMATimeSeries(core.ColumnarTimeSeries):
+	## Creates an SMA series.
+	#  @param key is used by update to take a value from a period.
+	def __init__(self, period = None, periods = None, key = operator.attrgetter('close')):
+		super().__init__(periodType = SMAPeriod, columns = {'sma' : 'd'}, periods = periods)
 		self.period = period
+		self.key = key
+		self._resetState()
 
-	@classmethod
-	def fromTimeSeries(cls, priceSeries, period, key = lambda p: p.close):
-		smaSeries = cls(period)
+	## Clears the running state used by update.
+	def _resetState(self):
+		## Values currently inside the window, oldest first.
+		self.window = collections.deque()
+		## Rolling sum of the window.
+		self.windowSum = RollingSum()
+		## Timestamp of the last period passed to update.
+		self.lastTimestamp = None
+
+	def _emptyLike(self):
+		series = super()._emptyLike()
+		series._resetState()
+		return series
+
+	## Advances the SMA by one value.
+	#  Values that are not newer than the last one are ignored.
+	#  @returns the new SMA value, or None if nothing was added.
+	def updateValue(self, timestamp, value):
+		if self.lastTimestamp is not None and timestamp <= self.lastTimestamp:
+			return None
+		self.lastTimestamp = timestamp
+
+		self.window.append(value)
+		self.windowSum.add(value)
+		if len(self.window) > self.period:
+			self.windowSum.add(-self.window.popleft())
+		if len(self.window) < self.period:
+			return None
 
-		# The number of periods we will have
-		length = len(priceSeries) - period + 1
-		for i in range(length):
-			smaSeries.emplace(priceSeries[i].timestamp, 
-				sma=sum([key(j) for j in priceSeries[i:i+period]])/float(period)
-			)
+		sma = self.windowSum.value()/float(self.period)
+		self.emplace(timestamp, sma = sma)
+		return sma
 
+	## Advances the SMA by one period, using the key of this series.
+	#  This costs O(1), regardless of the length of the series.
+	def update(self, newPeriod):
+		return self.updateValue(newPeriod.timestamp, self.key(newPeriod))
+
+	## Advances the SMA by several periods.
+	#  @param periods is a time series or a list of periods, in either order,
+	#  or an iterable of periods oldest first. See core.oldestFirst.
+	def extend(self, periods):
+		for p in core.oldestFirst(periods):
+			self.update(p)
+
+	## Runs the SMA over a column of values, from an empty running state.
+	#  This is the same rolling sum as updateValue, without building a period
+	#  for every value.
+	#  @param timestamps and values are arrays of int64 timestamps and values, oldest first.
+	def _extendColumn(self, timestamps, values):
+		window, windowSum, period = self.window, self.windowSum, self.period
+		smas = array.array('d')
+		for value in values:
+			window.append(value)
+			windowSum.add(value)
+			if len(window) > period:
+				windowSum.add(-window.popleft())
+			if len(window) == period:
+				smas.append(windowSum.value()/float(period))
+
+		if smas:
+			self.extendColumns(timestamps[len(timestamps) - len(smas):], {'sma' : smas})
+		if len(timestamps):
+			self.lastTimestamp = core.fromTimestamp(timestamps[-1])
+
+	## Creates an SMA series from values that were already computed.
+	#  The running state is restored from them, so the series can be updated.
+	#  @param timestamps and smas are arrays of int64 timestamps and SMA values, oldest first.
+	#  @param lastTimestamp is the datetime of the last value passed in, by default the last timestamp.
+	#  @param window is the list of values in the window, oldest first.
+	#  @param windowSum is the (total, compensation) of the rolling sum, by default the sum of the window.
+	@classmethod
+	def fromColumn(cls, period, timestamps, smas, key = operator.attrgetter('close'), lastTimestamp = None, window = None, windowSum = None):
+		smaSeries = cls(period, key = key)
+		smaSeries.extendColumns(timestamps, {'sma' : smas})
+		for value in window or []:
+			smaSeries.window.append(value)
+			smaSeries.windowSum.add(value)
+		if windowSum is not None:
+			smaSeries.windowSum.total, smaSeries.windowSum.compensation = windowSum
+		if lastTimestamp is None and len(timestamps):
+			lastTimestamp = core.fromTimestamp(timestamps[-1])
+		smaSeries.lastTimestamp = lastTimestamp
+		return smaSeries
+
+	@classmethod
+	@metrics.timed('indicator_seconds', {'indicator' : 'SMA'})
+	def fromTimeSeries(cls, priceSeries, period, key = operator.attrgetter('close')):
+		smaSeries = cls(period, key = key)
+		column = core.keyColumn(priceSeries, key)
+		if column is not None:
+			smaSeries._extendColumn(priceSeries.timestamps, priceSeries.column(column))
+		else:
+			smaSeries.extend(priceSeries)
+		metrics.increment('indicators_computed', labels = {'indicator' : 'SMA'})
 		return smaSeries
\ No newline at end of file
@@ -0,0 +1,102 @@
+## Batch indicator engine.
+#  Computes indicators for many symbols at once on a process pool.
+
+import concurrent.futures
+import math
+import operator
+import os
+import marketsnake.indicators.cache as cache
+
+## Describes one indicator to compute for every symbol.
+#  Keys are given as field names rather than functions,
+#  so that specs can be sent to worker processes.
+class IndicatorSpec(object):
+	## Creates an indicator spec.
+	#  @param name is the name the result is returned under.
+	#  @param indicator is an indicator series class, such as EMA.EMATimeSeries.
+	#  @param key is the name of the field to compute the indicator on.
+	#  @param params are passed on to fromTimeSeries, such as period = 26.
+	def __init__(self, name, indicator, key = 'close', **params):
+		self.name = name
+		self.indicator = indicator
+		self.key = key
+		self.params = params
+
+	## Computes this indicator on a time series.
+	#  @param indicatorCache optionally shares work with other specs.
+	def compute(self, timeSeries, indicatorCache = None):
+		if indicatorCache is not None:
+			return indicatorCache.get(self.indicator, timeSeries, self.key, **self.params)
+		return self.indicator.fromTimeSeries(timeSeries, key = operator.attrgetter(self.key), **self.params)
+
+## Computes every spec for a chunk of symbols.
+#  This runs inside the worker processes. Specs for the same symbol share
+#  a cache, so that overlapping indicators are only computed once.
+def _computeChunk(chunk, specs):
+	results = []
+	for symbol, timeSeries in chunk:
+		indicatorCache = cache.IndicatorCache()
+		results.append((symbol, {spec.name : spec.compute(timeSeries, indicatorCache) for spec in specs}))
+	return results
+
+## Computes indicators for many symbols on a pool of worker processes.
+#  The pool is kept between calls, so use this as a context manager
+#  or call shutdown when done.
+class IndicatorEngine(object):
+	## Creates an engine.
+	#  @param maxWorkers is the number of processes, by default one per core.
+	#  If it is 1, everything runs in this process.
+	#  @param chunkSize is the number of symbols sent to a worker at once.
+	#  By default, the symbols are split into about four chunks per worker.
+	def __init__(self, maxWorkers = None, chunkSize = None):
+		self.maxWorkers = maxWorkers
+		self.chunkSize = chunkSize
+		self.executor = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.shutdown()
+
+	## Starts the worker pool if it isn't running yet.
+	def _getExecutor(self):
+		if self.executor is None:
+			self.executor = concurrent.futures.ProcessPoolExecutor(max_workers = self.maxWorkers)
+		return self.executor
+
+	## Splits the symbols into chunks for the workers.
+	def _chunks(self, items):
+		chunkSize = self.chunkSize
+		if chunkSize is None:
+			workers = self.maxWorkers or os.cpu_count() or 1
+			chunkSize = max(1, math.ceil(len(items) / (workers * 4)))
+		return [items[i:i + chunkSize] for i in range(0, len(items), chunkSize)]
+
+	## Computes every spec for every symbol.
+	#  @param seriesBySymbol is a dictionary of symbols to price series.
+	#  @param specs is a list of IndicatorSpec.
+	#  @returns a dictionary of symbols to dictionaries of spec names to series.
+	def compute(self, seriesBySymbol, specs):
+		items = list(seriesBySymbol.items())
+		if self.maxWorkers == 1:
+			return dict(_computeChunk(items, specs))
+
+		results = {}
+		executor = self._getExecutor()
+		futures = [executor.submit(_computeChunk, chunk, specs) for chunk in self._chunks(items)]
+		for future in concurrent.futures.as_completed(futures):
+			results.update(future.result())
+		return {symbol : results[symbol] for symbol, _ in items}
+
+	## Stops the worker pool.
+	def shutdown(self):
+		if self.executor is not None:
+			self.executor.shutdown()
+			self.executor = None
+
+## Computes indicators for many symbols with a one-off engine.
+#  See IndicatorEngine.compute.
+def computeBatch(seriesBySymbol, specs, maxWorkers = None, chunkSize = None):
+	with IndicatorEngine(maxWorkers, chunkSize) as engine:
+		return engine.compute(seriesBySymbol, specs)
\ No newline at end of file
@@ -0,0 +1,114 @@
+## Indicator cache.
+#  Memoizes indicator series by source series, indicator, key and parameters,
+#  so that scripts and alert rules that build the same indicators share the work.
+
+import collections
+import operator
+import weakref
+import marketsnake.core as core
+import marketsnake.metrics as metrics
+
+## Estimates the memory used by a series, in bytes.
+def seriesBytes(series):
+	if isinstance(series, core.ColumnarTimeSeries):
+		return sum([c.itemsize * len(c) for c in series.columns.values()]) + series.timestamps.itemsize * len(series.timestamps)
+	elif isinstance(series, core.CompoundTimeSeries):
+		return sum([seriesBytes(s) for s in series.series.values()])
+	elif isinstance(series, core.AbstractTimeSeries):
+		return 200 * len(series)
+	return 0
+
+## LRU cache of computed indicator series.
+#  Entries are dropped when their source series changes, when the source
+#  series is garbage collected, or when the cache goes over its budget.
+#  Cached series are shared, so they should not be modified.
+class IndicatorCache(object):
+	## Creates a cache.
+	#  @param maxBytes is the memory budget, estimated from the columns.
+	#  @param maxEntries optionally limits the number of entries.
+	def __init__(self, maxBytes = 64 * 1024 * 1024, maxEntries = None):
+		self.maxBytes = maxBytes
+		self.maxEntries = maxEntries
+		self.entries = collections.OrderedDict()
+		self.bytes = 0
+
+		self.hits = 0
+		self.misses = 0
+
+		## Source series by id, so that entries can be dropped when they are collected.
+		self.sources = {}
+
+	def __len__(self):
+		return len(self.entries)
+
+	## Watches a source series, to drop its entries once it is collected.
+	def _watch(self, series):
+		sourceId = id(series)
+		if sourceId not in self.sources:
+			self_ = weakref.ref(self)
+			def collected(_, sourceId = sourceId):
+				cache = self_()
+				if cache is not None:
+					cache._dropSource(sourceId)
+			self.sources[sourceId] = weakref.ref(series, collected)
+
+	def _dropSource(self, sourceId):
+		self.sources.pop(sourceId, None)
+		for entryKey in [k for k in self.entries if k[0] == sourceId]:
+			self._drop(entryKey)
+
+	def _drop(self, entryKey):
+		_, _, size = self.entries.pop(entryKey)
+		self.bytes -= size
+
+	## Drops every entry computed from a series.
+	def invalidate(self, series):
+		self._dropSource(id(series))
+
+	## Drops every entry.
+	def clear(self):
+		self.entries.clear()
+		self.sources.clear()
+		self.bytes = 0
+
+	## Returns an indicator series, computing it only if it isn't cached.
+	#  Indicators with a fromCache class method (such as MACD) use it to
+	#  share their parts with other entries.
+	#  @param indicator is an indicator series class, such as EMA.EMATimeSeries.
+	#  @param series is the source series.
+	#  @param key is the name of the field to compute the indicator on.
+	#  @param params are passed on to the indicator, such as period = 26.
+	def get(self, indicator, series, key = 'close', **params):
+		entryKey = (id(series), indicator, key, tuple(sorted(params.items())))
+		entry = self.entries.get(entryKey)
+		if entry is not None:
+			version, value, _ = entry
+			if version == series.version:
+				self.hits += 1
+				metrics.increment('indicator_cache_hits')
+				self.entries.move_to_end(entryKey)
+				return value
+			# The series was appended to
+			self._drop(entryKey)
+
+		self.misses += 1
+		metrics.increment('indicator_cache_misses')
+		version = series.version
+		if hasattr(indicator, 'fromCache'):
+			value = indicator.fromCache(self, series, key, **params)
+		else:
+			value = indicator.fromTimeSeries(series, key = operator.attrgetter(key), **params)
+
+		self._watch(series)
+		size = seriesBytes(value)
+		self.entries[entryKey] = (version, value, size)
+		self.bytes += size
+		self._evict()
+		return value
+
+	## Drops the least recently used entries until the cache is within budget.
+	#  The newest entry is always kept.
+	def _evict(self):
+		while len(self.entries) > 1 and (self.bytes > self.maxBytes
+				or (self.maxEntries is not None and len(self.entries) > self.maxEntries)):
+			self._drop(next(iter(self.entries)))
\ No newline at end of file
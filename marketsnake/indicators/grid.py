@@ -0,0 +1,86 @@
+## Batched indicators over parameter grids.
+#  EMAs for many periods are advanced together in one pass over the values,
+#  and every requested MACD is derived from them.
+
+import array
+import operator
+import marketsnake.core as core
+import marketsnake.metrics as metrics
+import marketsnake.indicators.EMA as EMA
+import marketsnake.indicators.MACD as MACD
+
+## Computes EMAs for several periods in one pass.
+#  The EMAs are kept as one state vector, advanced once per value.
+#  Each EMA starts at the SMA of its first period values, exactly like EMATimeSeries.
+#  @param values is a sequence of values, oldest first.
+#  @param periods is a list of periods.
+#  @returns a dictionary of periods to arrays of EMA values.
+#  The EMA for period p starts at value p - 1.
+def emaMatrix(values, periods):
+	periods = sorted(set(periods))
+	mults = [2.0 / (p + 1.0) for p in periods]
+	rows = [array.array('d') for _ in periods]
+	seeds = {p - 1 : p for p in periods}
+
+	# The periods are sorted, so the seeded EMAs are always the first ones
+	state = []
+	for i, x in enumerate(values):
+		if state:
+			state = [(x - e)*m + e for e, m in zip(state, mults)]
+		p = seeds.get(i)
+		if p is not None:
+			state.append(sum(reversed(values[i - p + 1:i + 1]))/float(p))
+		for row, e in zip(rows, state):
+			row.append(e)
+
+	return dict(zip(periods, rows))
+
+## Returns the values and timestamps of a series, oldest first.
+def _columns(timeSeries, key):
+	if isinstance(timeSeries, core.ColumnarTimeSeries):
+		return timeSeries.timestamps, timeSeries.column(key)
+	periods = list(reversed(timeSeries))
+	return (array.array('q', [core.toTimestamp(p.timestamp) for p in periods]),
+		array.array('d', [getattr(p, key) for p in periods]))
+
+## Computes EMA series for several periods in one pass.
+#  @param key is the name of the field to compute the EMAs on.
+#  @returns a dictionary of periods to EMATimeSeries, which can be updated as usual.
+def emaSeries(timeSeries, periods, key = 'close'):
+	timestamps, values = _columns(timeSeries, key)
+	last = core.fromTimestamp(timestamps[-1]) if len(timestamps) else None
+	return {p : EMA.EMATimeSeries.fromColumn(p, timestamps[p - 1:], row, key = operator.attrgetter(key),
+				lastTimestamp = last, warmup = values if len(values) < p else None)
+		for p, row in emaMatrix(values, periods).items()}
+
+## Computes MACDs for many parameter sets.
+#  Every distinct EMA period is computed once, in one pass. Combinations with
+#  the same long and short periods share their base, and their signals are
+#  computed in one more pass over it.
+#  The MACDs keep sharing their base series, and only get their own copy of
+#  the running state of the EMAs. Updating several of them adds each bar to
+#  the shared base once, since bars already in a series are ignored.
+#  @param paramSets is a list of (longPeriod, shortPeriod, signalPeriod).
+#  @param key is the name of the field to compute the MACDs on.
+#  @returns a dictionary of parameter sets to MACDTimeSeries.
+@metrics.timed('indicator_seconds', {'indicator' : 'MACDGrid'})
+def macdGrid(timeSeries, paramSets, key = 'close'):
+	paramSets = [tuple(params) for params in paramSets]
+	emas = emaSeries(timeSeries, set([l for l, _, _ in paramSets] + [s for _, s, _ in paramSets]), key)
+
+	signalsByBase = {}
+	for l, s, g in paramSets:
+		signalsByBase.setdefault((l, s), set()).add(g)
+
+	results = {}
+	for (l, s), signalPeriods in signalsByBase.items():
+		base = emas[s] - emas[l]
+		values = base.column('ema')
+		last = core.fromTimestamp(base.timestamps[-1]) if len(base.timestamps) else None
+		for g, row in emaMatrix(values, signalPeriods).items():
+			signal = EMA.EMATimeSeries.fromColumn(g, base.timestamps[g - 1:], row, key = operator.attrgetter('ema'),
+				lastTimestamp = last, warmup = values if len(values) < g else None)
+			results[(l, s, g)] = MACD.MACDTimeSeries(base, signal, emas[l].copyState(), emas[s].copyState())
+
+	metrics.increment('indicators_computed', len(results), {'indicator' : 'MACD'})
+	return {params : results[params] for params in paramSets}
\ No newline at end of file
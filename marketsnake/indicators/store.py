@@ -0,0 +1,214 @@
+## Indicator store.
+#  Saves indicator series and events to disk with the running state they
+#  need for streaming updates, so that a restart doesn't have to recompute
+#  them over the full history.
+#
+#  A store file holds a JSON header followed by raw arrays in native byte
+#  order, each aligned to 8 bytes. The header describes every saved object
+#  and the offset of each of its columns, so the file can be memory-mapped
+#  and the columns copied straight into arrays.
+#  Series shared between objects, such as the base and signal of a MACD
+#  and of a crossover event on it, are saved once and shared again on load.
+
+import array
+import datetime
+import json
+import mmap
+import operator
+import os
+import struct
+import sys
+import marketsnake.core as core
+import marketsnake.indicators.EMA as EMA
+import marketsnake.indicators.SMA as SMA
+import marketsnake.indicators.MACD as MACD
+import marketsnake.events.crossover as crossover
+
+MAGIC = b'MSNKSTR1'
+_HEADER = struct.Struct('<Q')
+
+## Returns the field name of an attrgetter key.
+def _keyName(key):
+	if isinstance(key, operator.attrgetter):
+		_, args = key.__reduce__()
+		if len(args) == 1:
+			return args[0]
+	raise ValueError("Only operator.attrgetter keys can be saved, not %r" % (key,))
+
+def _toTimestamp(dt):
+	return core.toTimestamp(dt) if dt is not None else None
+
+def _fromTimestamp(t):
+	return core.fromTimestamp(t) if t is not None else None
+
+## Collects the records and columns of the objects being saved.
+class _Writer(object):
+	def __init__(self):
+		self.records = []
+		self.columns = []
+		self.ids = {}
+
+	## Adds a column.
+	#  @returns its index in the column table.
+	def column(self, values):
+		self.columns.append(values)
+		return len(self.columns) - 1
+
+	## Adds an object, unless it was added already.
+	#  @returns its index in the record table.
+	def add(self, obj):
+		if obj is None:
+			return None
+		if id(obj) in self.ids:
+			return self.ids[id(obj)]
+
+		if isinstance(obj, MACD.MACDTimeSeries):
+			obj._align()
+			record = {'type' : 'MACD',
+				'base' : self.add(obj.base), 'signal' : self.add(obj.signal),
+				'emaLong' : self.add(obj.emaLong), 'emaShort' : self.add(obj.emaShort),
+				'timestamps' : self.column(obj.timestamps),
+				'positions' : {k : self.column(p) for k, p in obj.positions.items()},
+				'lengths' : obj.lengths}
+		elif isinstance(obj, crossover.CrossoverEvent):
+			if obj.key is not None:
+				raise ValueError("Crossover events with a key can not be saved")
+			periods = list(reversed(obj))
+			record = {'type' : 'Crossover', 'field' : obj.field,
+				'base' : self.add(obj.base), 'signal' : self.add(obj.signal), 'delta' : self.add(obj.delta),
+				'timestamps' : self.column(array.array('q', [core.toTimestamp(p.timestamp) for p in periods])),
+				'dirs' : self.column(array.array('b', [p.dir.value for p in periods])),
+				'lastSign' : obj.lastSign, 'lastTimestamp' : _toTimestamp(obj.lastTimestamp)}
+		elif isinstance(obj, core.ColumnarTimeSeries):
+			record = {'timestamps' : self.column(obj.timestamps),
+				'columns' : {k : self.column(c) for k, c in obj.columns.items()}}
+			if isinstance(obj, EMA.EMATimeSeries):
+				record.update({'type' : 'EMA', 'period' : obj.period, 'key' : _keyName(obj.key),
+					'ema' : obj.ema, 'warmup' : obj.warmup, 'lastTimestamp' : _toTimestamp(obj.lastTimestamp)})
+			elif isinstance(obj, SMA.SMATimeSeries):
+				record.update({'type' : 'SMA', 'period' : obj.period, 'key' : _keyName(obj.key),
+					'window' : list(obj.window), 'windowSum' : [obj.windowSum.total, obj.windowSum.compensation],
+					'lastTimestamp' : _toTimestamp(obj.lastTimestamp)})
+			elif isinstance(obj, core.PriceTimeSeries):
+				record['type'] = 'Price'
+			else:
+				raise ValueError("%s can not be saved" % obj.__class__.__name__)
+		else:
+			raise ValueError("%s can not be saved" % obj.__class__.__name__)
+
+		if isinstance(obj, core.AbstractTimeSeries) and (obj.maxLength is not None or obj.maxAge is not None):
+			record['retention'] = [obj.maxLength, obj.maxAge.total_seconds() if obj.maxAge is not None else None, obj.slack]
+
+		self.records.append(record)
+		self.ids[id(obj)] = len(self.records) - 1
+		return len(self.records) - 1
+
+## Rebuilds the saved objects from their records.
+class _Reader(object):
+	def __init__(self, records, columns):
+		self.records = records
+		self.columns = columns
+		self.objects = {}
+
+	def get(self, index):
+		if index is None:
+			return None
+		if index not in self.objects:
+			record = self.records[index]
+			obj = self._build(record)
+			if 'retention' in record:
+				maxLength, maxAge, slack = record['retention']
+				obj.setRetention(maxLength, datetime.timedelta(seconds = maxAge) if maxAge is not None else None, slack)
+			self.objects[index] = obj
+		return self.objects[index]
+
+	def _build(self, record):
+		kind = record['type']
+		if kind == 'MACD':
+			macd = MACD.MACDTimeSeries(self.get(record['base']), self.get(record['signal']),
+				self.get(record['emaLong']), self.get(record['emaShort']))
+			if record['lengths'] is not None:
+				macd.timestamps = self.columns[record['timestamps']]
+				macd.positions = {k : self.columns[c] for k, c in record['positions'].items()}
+				macd.lengths = record['lengths']
+				macd.trimmed = {k : s.trimmed for k, s in macd.series.items()}
+			return macd
+
+		if kind == 'Crossover':
+			return crossover.CrossoverEvent.fromColumns(self.get(record['base']), self.get(record['signal']),
+				self.get(record['delta']), self.columns[record['timestamps']], self.columns[record['dirs']],
+				record['lastSign'], _fromTimestamp(record['lastTimestamp']), field = record['field'])
+
+		timestamps = self.columns[record['timestamps']]
+		columns = {k : self.columns[c] for k, c in record['columns'].items()}
+		if kind == 'EMA':
+			return EMA.EMATimeSeries.fromColumn(record['period'], timestamps, columns['ema'],
+				key = operator.attrgetter(record['key']), lastTimestamp = _fromTimestamp(record['lastTimestamp']),
+				warmup = record['warmup'], ema = record['ema'])
+		if kind == 'SMA':
+			return SMA.SMATimeSeries.fromColumn(record['period'], timestamps, columns['sma'],
+				key = operator.attrgetter(record['key']), lastTimestamp = _fromTimestamp(record['lastTimestamp']),
+				window = record['window'], windowSum = record['windowSum'])
+		if kind == 'Price':
+			series = core.PriceTimeSeries()
+			for k, c in columns.items():
+				series.columns[k] = array.array(c.typecode)
+			series.extendColumns(timestamps, columns)
+			return series
+		raise ValueError("Unknown record type %s" % kind)
+
+## Saves indicator series and events to a file.
+#  EMA, SMA, MACD and price series and crossover events can be saved.
+#  Alerts are not saved, and have to be set again after loading.
+#  The file is replaced at once, so a crash never leaves half a store.
+#  @param objects is a dictionary of names to objects.
+def save(filename, objects):
+	writer = _Writer()
+	names = {name : writer.add(obj) for name, obj in objects.items()}
+
+	offset = 0
+	table = []
+	for column in writer.columns:
+		table.append({'typecode' : column.typecode, 'offset' : offset, 'length' : len(column)})
+		offset += -(-len(column) * column.itemsize // 8) * 8
+
+	header = json.dumps({'byteorder' : sys.byteorder, 'names' : names,
+		'records' : writer.records, 'columns' : table}).encode('utf-8')
+	header += b' ' * (-(len(MAGIC) + _HEADER.size + len(header)) % 8)
+	start = len(MAGIC) + _HEADER.size + len(header)
+
+	with open(filename + '.tmp', 'wb') as f:
+		f.write(MAGIC)
+		f.write(_HEADER.pack(len(header)))
+		f.write(header)
+		for column, entry in zip(writer.columns, table):
+			f.seek(start + entry['offset'])
+			column.tofile(f)
+		f.truncate(start + offset)
+	os.replace(filename + '.tmp', filename)
+
+## Loads the objects saved to a file.
+#  The columns are copied from a memory map into arrays, so no object is
+#  built per bar. The objects can be updated right away.
+#  @returns a dictionary of names to objects.
+def load(filename):
+	with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+		if data[:len(MAGIC)] != MAGIC:
+			raise ValueError("%s is not an indicator store" % filename)
+		length, = _HEADER.unpack_from(data, len(MAGIC))
+		start = len(MAGIC) + _HEADER.size
+		header = json.loads(data[start:start + length].decode('utf-8'))
+		start += length
+
+		columns = []
+		with memoryview(data) as view:
+			for entry in header['columns']:
+				column = array.array(entry['typecode'])
+				begin = start + entry['offset']
+				column.frombytes(view[begin:begin + entry['length'] * column.itemsize])
+				if header['byteorder'] != sys.byteorder:
+					column.byteswap()
+				columns.append(column)
+
+	reader = _Reader(header['records'], columns)
+	return {name : reader.get(index) for name, index in header['names'].items()}
\ No newline at end of file
@@ -0,0 +1,266 @@
+## Pipeline metrics.
+#  Counters, timers and latency histograms for each stage of a run: fetching,
+#  parsing, indicators, events and alerts. Metrics are off until enabled, and
+#  cost a single check per call until then.
+#  Snapshots can be written as JSON or in the Prometheus text format.
+
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+## Default histogram buckets, in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+## Counts of observations by bucket.
+#  Each bucket counts the values up to its bound, and the last counts the rest.
+class Histogram(object):
+	def __init__(self, buckets = BUCKETS):
+		self.buckets = tuple(buckets)
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.count = 0
+		self.sum = 0.0
+		self.max = None
+
+	def observe(self, value):
+		self.counts[bisect.bisect_left(self.buckets, value)] += 1
+		self.count += 1
+		self.sum += value
+		if self.max is None or value > self.max:
+			self.max = value
+
+	## Estimates a quantile as the bound of the bucket it falls in.
+	#  @param q is between 0 and 1.
+	def quantile(self, q):
+		if not self.count:
+			return None
+		rank = q * self.count
+		total = 0
+		for bound, count in zip(self.buckets, self.counts):
+			total += count
+			if total >= rank:
+				return min(bound, self.max)
+		return self.max
+
+	def snapshot(self):
+		return {
+			'count' : self.count,
+			'sum' : self.sum,
+			'max' : self.max,
+			'p50' : self.quantile(0.5),
+			'p99' : self.quantile(0.99),
+			'buckets' : dict(zip([str(b) for b in self.buckets] + ['+Inf'], self.counts)),
+		}
+
+## Times a block into a histogram.
+class _Timer(object):
+	__slots__ = ('registry', 'name', 'labels', 'start')
+
+	def __init__(self, registry, name, labels):
+		self.registry = registry
+		self.name = name
+		self.labels = labels
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc):
+		self.registry.observe(self.name, time.perf_counter() - self.start, self.labels)
+
+## Timer used while metrics are disabled.
+class _NullTimer(object):
+	__slots__ = ()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		pass
+
+_NULL_TIMER = _NullTimer()
+
+## Formats a metric name and its labels, such as fetch_seconds{source="api"}.
+def _format(name, labels):
+	if not labels:
+		return name
+	return '%s{%s}' % (name, ','.join(['%s="%s"' % (k, str(v).replace('"', '\\"')) for k, v in labels]))
+
+## Collection of counters and histograms.
+#  Metrics are keyed by name and an optional dictionary of labels.
+#  Updates are locked, so metrics can be recorded from any thread.
+class Registry(object):
+	def __init__(self, enabled = False):
+		self.enabled = enabled
+		self.lock = threading.Lock()
+		self.counters = {}
+		self.histograms = {}
+
+	def enable(self):
+		self.enabled = True
+
+	def disable(self):
+		self.enabled = False
+
+	## Clears every metric.
+	def reset(self):
+		with self.lock:
+			self.counters.clear()
+			self.histograms.clear()
+
+	## Adds to a counter.
+	#  @param labels is an optional dictionary, such as {'indicator' : 'EMA'}.
+	def increment(self, name, amount = 1, labels = None):
+		if not self.enabled:
+			return
+		key = (name, tuple(sorted(labels.items())) if labels else ())
+		with self.lock:
+			self.counters[key] = self.counters.get(key, 0) + amount
+
+	## Records a value in a histogram, such as a latency in seconds.
+	#  @param buckets are used if the histogram doesn't exist yet.
+	def observe(self, name, value, labels = None, buckets = BUCKETS):
+		if not self.enabled:
+			return
+		key = (name, tuple(sorted(labels.items())) if labels else ())
+		with self.lock:
+			histogram = self.histograms.get(key)
+			if histogram is None:
+				histogram = self.histograms[key] = Histogram(buckets)
+			histogram.observe(value)
+
+	## Returns a context manager that records the seconds spent in its block.
+	def timer(self, name, labels = None):
+		if not self.enabled:
+			return _NULL_TIMER
+		return _Timer(self, name, labels)
+
+	## Decorates a function to record the seconds spent in each call.
+	def timed(self, name, labels = None):
+		def decorator(f):
+			@functools.wraps(f)
+			def wrapper(*args, **kwargs):
+				if not self.enabled:
+					return f(*args, **kwargs)
+				with _Timer(self, name, labels):
+					return f(*args, **kwargs)
+			return wrapper
+		return decorator
+
+	## Returns the value of a counter, or 0.
+	def counter(self, name, labels = None):
+		return self.counters.get((name, tuple(sorted(labels.items())) if labels else ()), 0)
+
+	## Returns a histogram, or None.
+	def histogram(self, name, labels = None):
+		return self.histograms.get((name, tuple(sorted(labels.items())) if labels else ()))
+
+	## Returns every metric as a dictionary.
+	def snapshot(self):
+		with self.lock:
+			return {
+				'time' : time.time(),
+				'counters' : {_format(name, labels) : value for (name, labels), value in sorted(self.counters.items())},
+				'histograms' : {_format(name, labels) : h.snapshot() for (name, labels), h in sorted(self.histograms.items())},
+			}
+
+	## Returns every metric as JSON.
+	def toJson(self):
+		return json.dumps(self.snapshot(), indent = 2)
+
+	## Returns every metric in the Prometheus text format.
+	#  @param prefix is added to every metric name.
+	def toPrometheus(self, prefix = 'marketsnake_'):
+		lines = []
+		with self.lock:
+			typed = set()
+			for (name, labels), value in sorted(self.counters.items()):
+				fullName = prefix + name + '_total'
+				if fullName not in typed:
+					typed.add(fullName)
+					lines.append('# TYPE %s counter' % fullName)
+				lines.append('%s %s' % (_format(fullName, labels), value))
+
+			for (name, labels), h in sorted(self.histograms.items()):
+				fullName = prefix + name
+				if fullName not in typed:
+					typed.add(fullName)
+					lines.append('# TYPE %s histogram' % fullName)
+				total = 0
+				for bound, count in zip([str(b) for b in h.buckets] + ['+Inf'], h.counts):
+					total += count
+					lines.append('%s %d' % (_format(fullName + '_bucket', labels + (('le', bound),)), total))
+				lines.append('%s %r' % (_format(fullName + '_sum', labels), h.sum))
+				lines.append('%s %d' % (_format(fullName + '_count', labels), h.count))
+		return '\n'.join(lines) + '\n'
+
+	## Writes a snapshot to a file.
+	#  The file is replaced at once, so readers never see half a snapshot.
+	#  @param format is 'json' or 'prometheus'. By default it is 'json' for
+	#  .json files, and 'prometheus' otherwise.
+	def writeSnapshot(self, filename, format = None):
+		if format is None:
+			format = 'json' if filename.endswith('.json') else 'prometheus'
+		if format not in ('json', 'prometheus'):
+			raise ValueError("Unknown format %s" % format)
+
+		text = self.toJson() if format == 'json' else self.toPrometheus()
+		temporary = filename + '.tmp'
+		with open(temporary, 'w') as f:
+			f.write(text)
+		os.replace(temporary, filename)
+
+## Default registry, used throughout the package.
+registry = Registry()
+
+## Writes snapshots to a file from a background thread.
+class SnapshotWriter(object):
+	## Creates a writer.
+	#  @param interval is the number of seconds between snapshots.
+	def __init__(self, filename, interval = 10.0, format = None, registry = registry):
+		self.filename = filename
+		self.interval = interval
+		self.format = format
+		self.registry = registry
+		self.stopped = threading.Event()
+		self.thread = None
+
+	def __enter__(self):
+		self.start()
+		return self
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def start(self):
+		if self.thread is None:
+			self.stopped.clear()
+			self.thread = threading.Thread(target = self._run, name = 'SnapshotWriter', daemon = True)
+			self.thread.start()
+
+	## Stops the thread, after writing one last snapshot.
+	def stop(self):
+		if self.thread is not None:
+			self.stopped.set()
+			self.thread.join()
+			self.thread = None
+
+	def _run(self):
+		while not self.stopped.wait(self.interval):
+			self.registry.writeSnapshot(self.filename, self.format)
+		self.registry.writeSnapshot(self.filename, self.format)
+
+## Shortcuts to the default registry.
+enable = registry.enable
+disable = registry.disable
+reset = registry.reset
+increment = registry.increment
+observe = registry.observe
+timer = registry.timer
+timed = registry.timed
+counter = registry.counter
+histogram = registry.histogram
+snapshot = registry.snapshot
+writeSnapshot = registry.writeSnapshot
\ No newline at end of file
@@ -0,0 +1,316 @@
+## Resident watcher.
+#  Fetches bars for a watchlist as each bar closes, updates indicators and
+#  events incrementally, and sends alerts through the events.
+#
+#  Bar timestamps are the start of each bar, so a bar with timestamp t
+#  closes at t + interval. Bar closes are aligned to multiples of the
+#  interval since midnight, in the time of the clock.
+
+import argparse
+import asyncio
+import datetime
+import logging
+import operator
+import os
+import signal
+import zoneinfo
+import marketsnake.core as core
+import marketsnake.metrics as metrics
+import marketsnake.events.crossover as crossover
+import marketsnake.indicators.MACD as MACD
+import marketsnake.indicators.store as store
+
+logger = logging.getLogger(__name__)
+
+## Time zone of AlphaVantage intraday bars.
+BAR_TIMEZONE = 'America/New_York'
+
+## Clock using the system time, in the time zone of the bars.
+class SystemClock(object):
+	## @param timezone is the time zone of the bars, as a tzinfo or a name
+	#  such as 'America/New_York', or None for the local time of the host.
+	def __init__(self, timezone = BAR_TIMEZONE):
+		self.timezone = zoneinfo.ZoneInfo(timezone) if isinstance(timezone, str) else timezone
+
+	## Returns the current time as an aware datetime in UTC.
+	def _utcnow(self):
+		return datetime.datetime.now(datetime.timezone.utc)
+
+	## Returns the current time as a naive datetime, like the bar timestamps.
+	def now(self):
+		return self._utcnow().astimezone(self.timezone).replace(tzinfo = None)
+
+	async def sleep(self, seconds):
+		await asyncio.sleep(seconds)
+
+## Clock that moves forward only when slept on, for running offline.
+class FakeClock(object):
+	def __init__(self, start):
+		self.time = start
+
+	def now(self):
+		return self.time
+
+	async def sleep(self, seconds):
+		self.time += datetime.timedelta(seconds = max(seconds, 0))
+		await asyncio.sleep(0)
+
+## Stand-in data source, serving recorded bars as if they were live.
+#  Only the bars that have closed by the time of the clock are returned,
+#  unless forming is set.
+class LocalSource(object):
+	## @param seriesBySymbol is a dictionary of symbols to price series.
+	#  @param limit is the number of bars returned, like a compact API response.
+	#  @param forming also returns the bar that is still forming, like the API does.
+	def __init__(self, seriesBySymbol, clock, limit = 100, forming = False):
+		self.seriesBySymbol = seriesBySymbol
+		self.clock = clock
+		self.limit = limit
+		self.forming = forming
+
+	async def Intraday(self, symbol, interval):
+		series = self.seriesBySymbol[symbol]
+		now = self.clock.now()
+		end = series._countOlder(now if self.forming else now - datetime.timedelta(minutes = interval), True)
+		start = max(0, end - self.limit) if self.limit is not None else 0
+
+		result = core.PriceTimeSeries()
+		result.extendColumns(series.timestamps[start:end], {k : c[start:end] for k, c in series.columns.items()})
+		return result
+
+## Returns the next time a bar closes, after now.
+def nextClose(now, interval):
+	step = interval * 60 * 1000000
+	midnight = core.toTimestamp(datetime.datetime(now.year, now.month, now.day))
+	t = core.toTimestamp(now)
+	return core.fromTimestamp(midnight + ((t - midnight) // step + 1) * step)
+
+## Symbol watched by a watcher.
+#  The base class only keeps the price series up to date. Subclasses add
+#  indicators and events in start, update and restore.
+class Watch(object):
+	## Creates a watch.
+	#  @param maxBars and maxAge optionally limit the history kept in memory,
+	#  so that a long running watcher doesn't keep growing. See setRetention.
+	def __init__(self, symbol, interval, maxBars = None, maxAge = None):
+		self.symbol = symbol
+		self.interval = interval
+		self.maxBars = maxBars
+		self.maxAge = maxAge
+		self.series = None
+
+	## Applies the retention limits of the watch to series.
+	def _retain(self, *series):
+		if self.maxBars is not None or self.maxAge is not None:
+			for s in series:
+				s.setRetention(self.maxBars, self.maxAge)
+
+	## Returns whether or not the watch has its history yet.
+	def started(self):
+		return self.series is not None
+
+	## Sets up the watch from the first bars fetched.
+	def start(self, series):
+		self.series = series
+		self._retain(series)
+
+	## Adds new bars, oldest first.
+	def update(self, periods):
+		for p in periods:
+			self.series.add(p)
+
+	## Returns the objects to save for a restart.
+	def state(self):
+		return {'price' : self.series}
+
+	## Restores the objects saved by state.
+	def restore(self, objects):
+		self.series = objects['price']
+
+## Watches for MACD crossovers, alerting on every one.
+#  The crossovers are of the MACD line over its signal line, so
+#  Direction.UP is the bullish crossover, as in backtest.backtestMACD.
+class CrossoverWatch(Watch):
+	def __init__(self, symbol, interval, alert = None, longPeriod = 26, shortPeriod = 12, signalPeriod = 9, key = 'close',
+			maxBars = None, maxAge = None):
+		super().__init__(symbol, interval, maxBars, maxAge)
+		self.alert = alert
+		self.params = (longPeriod, shortPeriod, signalPeriod)
+		self.key = key
+		self.macd = None
+		self.event = None
+
+	def start(self, series):
+		super().start(series)
+		self.macd = MACD.MACDTimeSeries.fromTimeSeries(series, *self.params, key = operator.attrgetter(self.key))
+		self.event = crossover.CrossoverEvent(self.macd.signal, self.macd.base, alert = self.alert)
+		self._retain(self.macd.base, self.macd.signal, self.macd.emaLong, self.macd.emaShort, self.event, self.event.delta)
+
+	## Adds new bars, and alerts on the crossovers they make.
+	#  @returns the new crossover periods.
+	def update(self, periods):
+		super().update(periods)
+		for p in periods:
+			self.macd.update(p)
+		return self.event.update()
+
+	def state(self):
+		return {'price' : self.series, 'macd' : self.macd, 'crossover' : self.event}
+
+	def restore(self, objects):
+		super().restore(objects)
+		self.macd = objects['macd']
+		self.event = objects['crossover']
+		self.event.alert = self.alert
+
+## Runs watches on a schedule aligned to bar closes.
+class Watcher(object):
+	## Creates a watcher.
+	#  @param source has an async Intraday(symbol, interval), such as AsyncAlphaVantage.
+	#  @param watches is a list of Watch objects.
+	#  @param clock is a SystemClock in the time zone of AlphaVantage bars by default.
+	#  @param maxConcurrent is the number of watches fetched and updated at once.
+	#  @param delay is the number of seconds to wait after a bar closes before
+	#  fetching it, to give the provider time to publish it.
+	#  @param storeDirectory optionally keeps the state of the watches across
+	#  restarts, with an indicator store per watch.
+	def __init__(self, source, watches, clock = None, maxConcurrent = 4, delay = 15.0, storeDirectory = None):
+		self.source = source
+		self.watches = list(watches)
+		self.clock = clock if clock is not None else SystemClock()
+		self.maxConcurrent = maxConcurrent
+		self.delay = delay
+		self.storeDirectory = storeDirectory
+		self.stopped = asyncio.Event()
+
+		self.cycles = 0
+		self.failed = 0
+
+	## Asks the watcher to stop after the watches that are running.
+	def stop(self):
+		self.stopped.set()
+
+	def _storeFile(self, watch):
+		return os.path.join(self.storeDirectory, '%s_%dmin.msi' % (watch.symbol, watch.interval))
+
+	## Restores the watches saved by the last run.
+	def _restore(self):
+		for watch in self.watches:
+			filename = self._storeFile(watch)
+			if os.path.exists(filename):
+				try:
+					watch.restore(store.load(filename))
+				except Exception:
+					logger.exception("Failed to restore %s, it will be rebuilt", filename)
+
+	## Saves the watches for the next run.
+	def _save(self):
+		os.makedirs(self.storeDirectory, exist_ok = True)
+		for watch in self.watches:
+			if watch.started():
+				store.save(self._storeFile(watch), watch.state())
+
+	## Returns when a watch is next due.
+	def _due(self, watch):
+		return nextClose(self.clock.now(), watch.interval) + datetime.timedelta(seconds = self.delay)
+
+	## Fetches the new bars of a watch and updates it.
+	async def _run(self, watch, semaphore):
+		async with semaphore:
+			try:
+				series = await self.source.Intraday(watch.symbol, watch.interval)
+
+				# Leave out the bar that is still forming
+				now = self.clock.now()
+				closed = series._countOlder(now - datetime.timedelta(minutes = watch.interval), True)
+				if not watch.started():
+					history = core.PriceTimeSeries()
+					history.extendColumns(series.timestamps[:closed], {k : c[:closed] for k, c in series.columns.items()})
+					with metrics.timer('watch_seconds'):
+						await asyncio.to_thread(watch.start, history)
+				else:
+					start = series._countOlder(watch.series[0].timestamp, True) if len(watch.series) else 0
+					periods = [series._row(i) for i in range(start, closed)]
+					if periods:
+						with metrics.timer('watch_seconds'):
+							await asyncio.to_thread(watch.update, periods)
+						metrics.observe('bar_latency_seconds',
+							(now - periods[-1].timestamp).total_seconds() - watch.interval * 60)
+			except Exception:
+				self.failed += 1
+				metrics.increment('watch_failed')
+				logger.exception("Failed to update %s", watch.symbol)
+
+	## Runs the watches until stop is called.
+	#  @param until optionally stops the watcher at a time of the clock.
+	async def run(self, until = None):
+		semaphore = asyncio.Semaphore(self.maxConcurrent)
+		if self.storeDirectory is not None:
+			self._restore()
+
+		# Start every watch right away, then follow the bar closes
+		due = {watch : self.clock.now() for watch in self.watches}
+		try:
+			while not self.stopped.is_set():
+				nextDue = min(due.values())
+				if until is not None and nextDue > until:
+					break
+
+				wait = (nextDue - self.clock.now()).total_seconds()
+				if wait > 0:
+					sleep = asyncio.ensure_future(self.clock.sleep(wait))
+					stopped = asyncio.ensure_future(self.stopped.wait())
+					await asyncio.wait([sleep, stopped], return_when = asyncio.FIRST_COMPLETED)
+					sleep.cancel()
+					stopped.cancel()
+					if self.stopped.is_set():
+						break
+
+				running = [watch for watch, t in due.items() if t <= self.clock.now()]
+				await asyncio.gather(*[self._run(watch, semaphore) for watch in running])
+				for watch in running:
+					due[watch] = self._due(watch)
+				self.cycles += 1
+				metrics.increment('watch_cycles')
+		finally:
+			if self.storeDirectory is not None:
+				self._save()
+
+## Watches symbols for MACD crossovers, emailing every one.
+def main(args = None):
+	import marketsnake.alerts.dispatch as dispatch
+	import marketsnake.alerts.email as email
+	import marketsnake.data.asyncclient as asyncclient
+
+	parser = argparse.ArgumentParser(description = 'Watches symbols for MACD crossovers.')
+	parser.add_argument('symbols', nargs = '+')
+	parser.add_argument('--config', default = 'config.ini')
+	parser.add_argument('--interval', type = int, default = 5, help = 'minutes per bar')
+	parser.add_argument('--timezone', default = BAR_TIMEZONE, help = 'time zone of the bar timestamps')
+	parser.add_argument('--to', required = True, help = 'address to email alerts to')
+	parser.add_argument('--max-concurrent', type = int, default = 4)
+	parser.add_argument('--store', help = 'directory to keep indicator state in across restarts')
+	parser.add_argument('--max-bars', type = int, help = 'number of bars to keep in memory per symbol')
+	args = parser.parse_args(args)
+
+	async def watch():
+		mail = email.Email(args.config)
+		with dispatch.AlertDispatcher() as dispatcher:
+			async with asyncclient.AsyncAlphaVantage(args.config) as source:
+				watches = [CrossoverWatch(symbol, args.interval,
+					dispatcher.wrap(email.EmailAlert(mail, args.to, '%s MACD crossover' % symbol)), maxBars = args.max_bars)
+					for symbol in args.symbols]
+				watcher = Watcher(source, watches, clock = SystemClock(args.timezone),
+					maxConcurrent = args.max_concurrent, storeDirectory = args.store)
+
+				loop = asyncio.get_running_loop()
+				for s in (signal.SIGINT, signal.SIGTERM):
+					loop.add_signal_handler(s, watcher.stop)
+				await watcher.run()
+		mail.close()
+
+	logging.basicConfig(level = logging.INFO)
+	asyncio.run(watch())
+
+if __name__ == '__main__':
+	main()
\ No newline at end of file
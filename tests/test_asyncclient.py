@@ -0,0 +1,111 @@
+import asyncio
+import http.server
+import os
+import threading
+import pytest
+import marketsnake.data.alphavantage as alphavantage
+import marketsnake.data.asyncclient as asyncclient
+
+DATA = os.path.join(os.path.dirname(__file__), 'testData.dat')
+
+CONFIG = """[TESTING]
+TEST_MODE = off
+TEST_DATA = %s
+
+[API]
+API_KEY = test
+ENDPOINT_BASE = http://127.0.0.1:%d/query?apikey=%%s&%%s
+FUNC_INTRADAY = function=TIME_SERIES_INTRADAY&symbol=%%s&interval=%%dmin&datatype=json
+REQUESTS_PER_MINUTE = 600
+REQUESTS_PER_DAY = 5000
+MAX_CONNECTIONS = 4
+"""
+
+## Local API serving the test payload over persistent connections.
+#  The requests listed in failures are answered with that HTTP status.
+class StubAPI(http.server.ThreadingHTTPServer):
+	daemon_threads = True
+
+	def __init__(self):
+		super().__init__(('127.0.0.1', 0), StubHandler)
+		with open(DATA, 'rb') as f:
+			self.payload = f.read()
+		self.lock = threading.Lock()
+		self.requests = 0
+		self.clients = set()
+		self.failures = {}
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def do_GET(self):
+		server = self.server
+		with server.lock:
+			server.requests += 1
+			server.clients.add(self.client_address)
+			status = server.failures.get(server.requests, 200)
+		body = server.payload if status == 200 else b''
+		self.send_response(status)
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, *args):
+		pass
+
+@pytest.fixture
+def server():
+	server = StubAPI()
+	thread = threading.Thread(target = server.serve_forever, daemon = True)
+	thread.start()
+	yield server
+	server.shutdown()
+	server.server_close()
+
+@pytest.fixture
+def config(server, tmp_path):
+	config = tmp_path / 'config.ini'
+	config.write_text(CONFIG % (DATA, server.server_port))
+	return str(config)
+
+def fetch(config, symbols):
+	async def run():
+		async with asyncclient.AsyncAlphaVantage(config, backoff = 0.01) as client:
+			return await client.IntradayMany(symbols, 5)
+	return asyncio.run(run())
+
+## Many symbols are fetched at once over a few reused connections,
+#  and server errors are retried.
+def test_intradayMany(server, config):
+	server.failures = {2 : 503, 5 : 429}
+	symbols = ['S%d' % i for i in range(20)]
+	results = fetch(config, symbols)
+
+	with open(DATA) as f:
+		expected = alphavantage.parseIntraday(f, 5)
+	assert sorted(results) == sorted(symbols)
+	assert all(list(series.timestamps) == list(expected.timestamps) for series in results.values())
+	assert server.requests == 22
+	assert len(server.clients) <= 4
+
+## Client errors are not retried.
+def test_clientError(server, config):
+	server.failures = {1 : 404}
+	with pytest.raises(asyncclient.ClientError):
+		fetch(config, ['S0'])
+	assert server.requests == 1
+
+## Idle connections list that another thread always empties first.
+class DrainedList(list):
+	def __len__(self):
+		return 1
+
+	def pop(self):
+		raise IndexError("pop from empty list")
+
+## A thread that loses the race for the last idle connection opens a new one.
+def test_poolRace(server):
+	pool = asyncclient.ConnectionPool()
+	pool.idle[('http', '127.0.0.1:%d' % server.server_port)] = DrainedList()
+	assert pool.get('http://127.0.0.1:%d/query' % server.server_port) == server.payload
+	pool.close()
\ No newline at end of file
@@ -0,0 +1,88 @@
+import datetime
+import os
+import random
+import marketsnake.backtest as backtest
+import marketsnake.core as core
+import marketsnake.data.alphavantage as alphavantage
+import marketsnake.events.crossover as crossover
+import marketsnake.indicators.MACD as MACD
+from marketsnake.core import Direction
+
+DATA = os.path.join(os.path.dirname(__file__), 'testData.dat')
+START = datetime.datetime(2020, 1, 1)
+MINUTE = datetime.timedelta(minutes = 1)
+
+def loadSeries():
+	with open(DATA) as f:
+		return alphavantage.parseIntraday(f, 5)
+
+## Random walk of one bar a minute.
+def makePrices(count, seed):
+	rng = random.Random(seed)
+	close, periods = 100.0, []
+	for i in range(count):
+		close *= 1.0 + rng.gauss(0, 0.01)
+		periods.append(core.PricePeriod(START + i * MINUTE, close, close, close, close, 100))
+	return core.PriceTimeSeries(periods = periods)
+
+def summary(results):
+	return [(r.symbol, r.params, r.trades) for r in results]
+
+## Long trades are entered where the MACD line crosses above its signal line.
+def test_direction():
+	series = loadSeries()
+	macd = MACD.MACDTimeSeries.fromTimeSeries(series)
+	result = backtest.backtestMACD('AAPL', series, {'longPeriod' : 26, 'shortPeriod' : 12, 'signalPeriod' : 9})
+	assert result.trades
+
+	for entry, _, dir, _ in result.trades:
+		assert dir is Direction.UP
+		i = macd.index(entry)
+		assert macd[i].base.ema > macd[i].signal.ema
+		assert macd[i + 1].base.ema <= macd[i + 1].signal.ema
+
+## Trades pair each crossover with the next one, and the last position is
+#  closed at the last bar.
+def test_simulate():
+	closes = [10.0, 11.0, 12.0, 10.0, 9.0, 8.0, 10.0, 12.0, 15.0, 16.0]
+	prices = core.PriceTimeSeries(periods = [core.PricePeriod(START + i * MINUTE, c, c, c, c, 100) for i, c in enumerate(closes)])
+	crossovers = core.AbstractTimeSeries(crossover.CrossoverPeriod)
+	for i, dir in ((1, Direction.UP), (3, Direction.DOWN), (6, Direction.UP), (12, Direction.DOWN)):
+		crossovers.emplace(START + i * MINUTE, dir = dir)
+	t = lambda i: START + i * MINUTE
+
+	assert backtest.simulate(prices, crossovers) == [
+		(t(1), t(3), Direction.UP, 10.0 / 11.0 - 1.0),
+		(t(6), t(9), Direction.UP, 16.0 / 10.0 - 1.0),
+	]
+	assert backtest.simulate(prices, crossovers, allowShort = True) == [
+		(t(1), t(3), Direction.UP, 10.0 / 11.0 - 1.0),
+		(t(3), t(6), Direction.DOWN, 1.0 - 10.0 / 10.0),
+		(t(6), t(9), Direction.UP, 16.0 / 10.0 - 1.0),
+	]
+
+	result = backtest.BacktestResult('AAPL', {}, backtest.simulate(prices, crossovers))
+	assert result.count == 2 and result.hitRate == 0.5
+	assert abs(result.pnl - (10.0 / 11.0 * 1.6 - 1.0)) < 1e-12
+	assert abs(result.maxDrawdown - (1.0 - 10.0 / 11.0)) < 1e-12
+	assert backtest.simulate(core.PriceTimeSeries(), crossovers) == []
+
+## Running on worker processes gives the same results, in the same order,
+#  as running in this process, whether the work is split by symbol or by
+#  parameter set.
+def test_workers():
+	seriesBySymbol = {'S%d' % i : makePrices(500, i) for i in range(3)}
+	paramSets = backtest.parameterGrid([20, 26], [8, 12], [5, 9])
+	assert len(paramSets) == 8
+
+	for symbols in (seriesBySymbol, {'S0' : seriesBySymbol['S0']}):
+		for allowShort in (False, True):
+			expected = summary(backtest.runBacktests(symbols, paramSets, allowShort, maxWorkers = 1))
+			assert [(s, p) for s, p, _ in expected] == [(s, p) for s in symbols for p in paramSets]
+			assert summary(backtest.runBacktests(symbols, paramSets, allowShort, maxWorkers = 4)) == expected
+
+## Parameter sets are split into contiguous chunks of about the same length.
+def test_chunks():
+	assert backtest._chunks(list(range(7)), 3) == [[0, 1, 2], [3, 4], [5, 6]]
+	assert backtest._chunks(list(range(2)), 4) == [[0], [1]]
+	assert backtest._chunks([], 2) == [[]]
\ No newline at end of file
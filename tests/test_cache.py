@@ -0,0 +1,68 @@
+import datetime
+import os
+import marketsnake.core as core
+import marketsnake.data.cache as cache
+
+def makeSeries(start, count):
+	return core.PriceTimeSeries([core.PricePeriod(start + datetime.timedelta(minutes = 5 * i), 1.0, 2.0, 0.5, 1.5, i)
+		for i in range(count)])
+
+## Bars are evicted in batches, and the columns are only read when they are.
+def test_evict(tmp_path, monkeypatch):
+	bars = cache.BarCache(str(tmp_path), maxBars = 100, maxAge = datetime.timedelta(hours = 6))
+	reads = []
+	read = bars._read
+	monkeypatch.setattr(bars, '_read', lambda *args: reads.append(args) or read(*args))
+
+	start = datetime.datetime(2020, 1, 1)
+	series = makeSeries(start, 200)
+	bars.merge('AAPL', 5, makeSeries(start, 80))
+	bars.merge('AAPL', 5, makeSeries(start, 90))
+	assert reads == []
+	assert len(bars.load('AAPL', 5)) == 90
+	del reads[:]
+
+	# Over six hours of bars, by more than the slack
+	bars.merge('AAPL', 5, series)
+	assert len(reads) == 1
+	loaded = bars.load('AAPL', 5)
+	assert len(loaded) == 73
+	assert loaded[0].timestamp == series[0].timestamp
+	assert loaded[-1].timestamp == series[0].timestamp - datetime.timedelta(hours = 6)
+
+## A crash in the middle of an eviction leaves the bars as they were.
+def test_evictCrash(tmp_path, monkeypatch):
+	bars = cache.BarCache(str(tmp_path), maxBars = 50)
+	start = datetime.datetime(2020, 1, 1)
+	bars.merge('AAPL', 5, makeSeries(start, 50))
+	before = [(p.timestamp, p.volume) for p in bars.load('AAPL', 5)]
+
+	class Crash(Exception):
+		pass
+
+	# Crash after writing three of the six new columns
+	writes = []
+	def crashingOpen(filename, mode = 'r', *args):
+		if mode == 'wb':
+			writes.append(filename)
+			if len(writes) == 4:
+				raise Crash()
+		return open(filename, mode, *args)
+	monkeypatch.setattr(cache, 'open', crashingOpen, raising = False)
+	try:
+		bars.merge('AAPL', 5, makeSeries(start, 70))
+	except Crash:
+		pass
+	monkeypatch.undo()
+
+	loaded = cache.BarCache(str(tmp_path), maxBars = 50).load('AAPL', 5)
+	appended = makeSeries(start, 70)
+	assert [(p.timestamp, p.volume) for p in loaded] == [(p.timestamp, p.volume) for p in appended]
+	assert before == [(p.timestamp, p.volume) for p in appended][20:]
+
+	# The next eviction goes through
+	bars.merge('AAPL', 5, makeSeries(start, 71))
+	loaded = bars.load('AAPL', 5)
+	assert len(loaded) == 50
+	assert [(p.timestamp, p.volume) for p in loaded] == [(p.timestamp, p.volume) for p in makeSeries(start, 71)][:50]
+	assert sorted(os.listdir(bars.path('AAPL', 5))) == ['CURRENT', 'gen1']
\ No newline at end of file
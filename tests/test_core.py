@@ -0,0 +1,20 @@
+import datetime
+import marketsnake.core as core
+import marketsnake.indicators.EMA as EMA
+
+def makeSeries(cls, values):
+	start = datetime.datetime(2020, 1, 1)
+	return cls(periods = [EMA.EMAPeriod(start + datetime.timedelta(minutes = i), v) for i, v in enumerate(values)])
+
+## Arithmetic works across storage engines, in both directions.
+def test_mixedArithmetic():
+	columnar = makeSeries(EMA.EMATimeSeries, [1.0, 2.0, 3.0])
+	periods = core.AbstractTimeSeries(EMA.EMAPeriod, list(makeSeries(EMA.EMATimeSeries, [0.5, 0.5, 0.5, 0.5])))
+
+	difference = columnar - periods
+	assert isinstance(difference, EMA.EMATimeSeries)
+	assert [p.ema for p in difference] == [2.5, 1.5, 0.5]
+
+	difference = periods - columnar
+	assert isinstance(difference, core.AbstractTimeSeries)
+	assert [p.ema for p in difference] == [-2.5, -1.5, -0.5]
\ No newline at end of file
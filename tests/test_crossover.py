@@ -0,0 +1,34 @@
+import datetime
+import random
+import marketsnake.core as core
+import marketsnake.indicators.EMA as EMA
+import marketsnake.events.crossover as crossover
+
+def crossings(event):
+	return [(p.timestamp, p.dir) for p in event]
+
+## Updating bar by bar finds the same crossovers as finding them at once,
+#  for columnar series, series of periods, and with a key.
+def test_update():
+	rng = random.Random(1)
+	start = datetime.datetime(2020, 1, 1)
+	values = [(rng.gauss(0, 1), rng.gauss(0, 1)) for _ in range(300)]
+	makers = [
+		(lambda: EMA.EMATimeSeries(), None),
+		(lambda: core.AbstractTimeSeries(EMA.EMAPeriod), None),
+		(lambda: EMA.EMATimeSeries(), lambda p: p.ema),
+	]
+	for make, key in makers:
+		base, signal = make(), make()
+		for i, (b, s) in enumerate(values[:200]):
+			base.emplace(start + datetime.timedelta(minutes = i), ema = b)
+			signal.emplace(start + datetime.timedelta(minutes = i), ema = s)
+		event = crossover.CrossoverEvent(base, signal, key = key)
+		for i, (b, s) in enumerate(values[200:], 200):
+			base.emplace(start + datetime.timedelta(minutes = i), ema = b)
+			signal.emplace(start + datetime.timedelta(minutes = i), ema = s)
+			event.update()
+
+		whole = crossover.CrossoverEvent(base, signal, key = key)
+		assert crossings(event) == crossings(whole)
+		assert [p.ema for p in event.delta] == [p.ema for p in whole.delta]
\ No newline at end of file
@@ -0,0 +1,104 @@
+import socketserver
+import threading
+import time
+import pytest
+import marketsnake.alerts.dispatch as dispatch
+import marketsnake.alerts.email as email
+
+## Stub SMTP server that keeps the messages it is sent.
+#  The session is closed after each message, like a server dropping idle
+#  sessions. With hang set, the next session stops answering after EHLO.
+class StubSMTP(socketserver.ThreadingTCPServer):
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self):
+		super().__init__(('127.0.0.1', 0), StubHandler)
+		self.messages = []
+		self.sessions = 0
+		self.hang = False
+		self.released = threading.Event()
+
+class StubHandler(socketserver.StreamRequestHandler):
+	def handle(self):
+		server = self.server
+		server.sessions += 1
+		hang, server.hang = server.hang, False
+		self.wfile.write(b'220 stub\r\n')
+		lines = None
+		while True:
+			line = self.rfile.readline()
+			if not line:
+				return
+			if lines is not None:
+				if line == b'.\r\n':
+					server.messages.append(b''.join(lines))
+					self.wfile.write(b'250 ok\r\n')
+					return
+				lines.append(line)
+				continue
+
+			command = line[:4].upper()
+			if hang and command != b'EHLO':
+				server.released.wait(10)
+				return
+			if command == b'DATA':
+				lines = []
+				self.wfile.write(b'354 go on\r\n')
+			elif command == b'QUIT':
+				self.wfile.write(b'221 bye\r\n')
+				return
+			else:
+				self.wfile.write(b'250 ok\r\n')
+
+@pytest.fixture
+def server():
+	server = StubSMTP()
+	thread = threading.Thread(target = server.serve_forever, daemon = True)
+	thread.start()
+	yield server
+	server.released.set()
+	server.shutdown()
+	server.server_close()
+
+@pytest.fixture
+def mail(server, tmp_path):
+	config = tmp_path / 'mail.ini'
+	config.write_text('[MAIL]\nSMTP_HOST = 127.0.0.1\nSMTP_PORT = %d\nSMTP_SSL = off\nSMTP_TIMEOUT = 0.5\n'
+		'MAIL_ADDRESS = snake@example.com\nMAIL_PASSWORD =\n' % server.server_address[1])
+	mail = email.Email(str(config))
+	yield mail
+	mail.close()
+
+def subjects(server):
+	return sorted([m.split(b'Subject: ')[1].split(b'\n')[0].strip().decode() for m in server.messages])
+
+## Dropped sessions are opened again, and the email is still sent.
+def test_reconnect(server, mail):
+	mail.sendEmail('a@example.com', 'one', 'body')
+	mail.sendEmail('a@example.com', 'two', 'body')
+	assert subjects(server) == ['one', 'two']
+	assert server.sessions == 2
+
+## A server that stops answering times out, rather than hanging the sender.
+def test_timeout(server, mail):
+	mail.sendEmail('a@example.com', 'one', 'body')
+	server.hang = True
+	mail.connect()
+
+	start = time.monotonic()
+	mail.sendEmail('a@example.com', 'two', 'body')
+	assert time.monotonic() - start < 5
+	assert subjects(server) == ['one', 'two']
+
+## Alerts to the same recipient are sent as one digest from the dispatcher.
+def test_dispatch(server, mail):
+	macd = email.EmailAlert(mail, 'a@example.com', 'MACD')
+	sma = email.EmailAlert(mail, 'a@example.com', 'SMA')
+	other = email.EmailAlert(mail, 'b@example.com', 'MACD')
+	with dispatch.AlertDispatcher(digestWindow = 0.2) as dispatcher:
+		dispatcher.wrap(macd)('one')
+		dispatcher.submit(sma, 'two')
+		dispatcher.submit(other, 'three')
+	assert dispatcher.sent == 3 and dispatcher.failed == 0
+	assert subjects(server) == ['MACD', 'Market Snake (2 alerts)']
\ No newline at end of file
@@ -0,0 +1,127 @@
+import math
+import operator
+import os
+import marketsnake.core as core
+import marketsnake.data.alphavantage as alphavantage
+import marketsnake.indicators.EMA as EMA
+import marketsnake.indicators.SMA as SMA
+import marketsnake.indicators.MACD as MACD
+import marketsnake.indicators.grid as grid
+import marketsnake.indicators.store as store
+
+DATA = os.path.join(os.path.dirname(__file__), 'testData.dat')
+
+def loadSeries():
+	with open(DATA) as f:
+		return alphavantage.parseIntraday(f, 5)
+
+def values(series, field):
+	return [(p.timestamp, getattr(p, field)) for p in series]
+
+## Slices of a series are newest first, like the series itself.
+def test_slices():
+	series = loadSeries()
+	periods = series[0:50]
+	whole = EMA.EMATimeSeries.fromTimeSeries(series, 10)
+
+	ema = EMA.EMATimeSeries.fromTimeSeries(periods, 10)
+	assert len(ema) == 41
+	assert ema[0].timestamp == series[0].timestamp
+	assert values(ema, 'ema') == values(EMA.EMATimeSeries.fromTimeSeries(list(reversed(periods)), 10), 'ema')
+	assert abs(ema[0].ema - whole[0].ema) < 0.01
+
+	assert len(SMA.SMATimeSeries.fromTimeSeries(periods, 10)) == 41
+	assert len(MACD.MACDTimeSeries.fromTimeSeries(series[0:60])) == 27
+
+## Extending with newer periods in either order gives the same series.
+def test_extend():
+	series = loadSeries()
+	older = EMA.EMATimeSeries.fromTimeSeries(series[20:], 10)
+	newer = EMA.EMATimeSeries.fromTimeSeries(series[20:], 10)
+	older.extend(series[0:20])
+	newer.extend(iter(list(reversed(series[0:20]))))
+	assert values(older, 'ema') == values(newer, 'ema')
+	assert values(older, 'ema') == values(EMA.EMATimeSeries.fromTimeSeries(series, 10), 'ema')
+
+## Views from datetime slices and windows are newest first too.
+def test_views():
+	series = loadSeries()
+	view = series.window(series[59].timestamp, series[0].timestamp)
+	assert len(view) == 60
+	assert values(EMA.EMATimeSeries.fromTimeSeries(view, 10), 'ema') == values(EMA.EMATimeSeries.fromTimeSeries(series[0:60], 10), 'ema')
+	assert values(SMA.SMATimeSeries.fromTimeSeries(series[series[0].timestamp:series[60].timestamp], 10), 'sma') == \
+		values(SMA.SMATimeSeries.fromTimeSeries(series[0:60], 10), 'sma')
+	assert len(MACD.MACDTimeSeries.fromTimeSeries(view)) == 27
+
+	macd = MACD.MACDTimeSeries.fromTimeSeries(series)
+	assert len(EMA.EMATimeSeries.fromTimeSeries(macd[0:20], 5, key = lambda p: p.base.ema)) == 16
+
+## A MACD made from cached EMAs only keeps their running state, and
+#  updates like one computed from scratch.
+def test_macdFromEMAs(tmp_path):
+	series = loadSeries()
+	older, newer = series[10:], list(reversed(series[0:10]))
+	emaLong, emaShort = EMA.EMATimeSeries.fromTimeSeries(older, 26), EMA.EMATimeSeries.fromTimeSeries(older, 12)
+
+	macd = MACD.MACDTimeSeries.fromEMAs(emaLong, emaShort, 9)
+	assert len(macd.emaLong) == 0 and len(macd.emaShort) == 0
+	store.save(str(tmp_path / 'macd.msi'), {'macd' : macd})
+	loaded = store.load(str(tmp_path / 'macd.msi'))['macd']
+
+	whole = MACD.MACDTimeSeries.fromTimeSeries(series)
+	for m in (macd, loaded):
+		m.extend(newer)
+		assert values(m.signal, 'ema') == values(whole.signal, 'ema')
+		assert len(m.emaLong) == 10
+	assert len(emaLong) == len(older) - 25
+
+## MACDs from a grid share their base, and update like separate ones.
+def test_macdGrid():
+	series = loadSeries()
+	older, newer = series[10:], list(reversed(series[0:10]))
+	params = [(26, 12, 9), (26, 12, 5), (20, 10, 9)]
+	macds = grid.macdGrid(older, params)
+	assert macds[(26, 12, 9)].base is macds[(26, 12, 5)].base
+
+	for p in params:
+		macds[p].extend(newer)
+		whole = MACD.MACDTimeSeries.fromTimeSeries(series, *p)
+		assert values(macds[p].base, 'ema') == values(whole.base, 'ema')
+		assert values(macds[p].signal, 'ema') == values(whole.signal, 'ema')
+
+## Series computed from the columns of a series are the same as those
+#  computed period by period, down to the running state.
+def test_fromColumns():
+	series = loadSeries()
+	for periods in (series, series[0:20], series[0:5]):
+		columnar = core.PriceTimeSeries(periods)
+		for field in ('close', 'volume'):
+			key = operator.attrgetter(field)
+			for period in (5, 10, 26):
+				fast, slow = EMA.EMATimeSeries.fromTimeSeries(columnar, period, key), EMA.EMATimeSeries.fromTimeSeries(list(periods), period, key)
+				assert values(fast, 'ema') == values(slow, 'ema')
+				assert (fast.ema, fast.warmup, fast.lastTimestamp) == (slow.ema, slow.warmup, slow.lastTimestamp)
+
+				fast, slow = SMA.SMATimeSeries.fromTimeSeries(columnar, period, key), SMA.SMATimeSeries.fromTimeSeries(list(periods), period, key)
+				assert values(fast, 'sma') == values(slow, 'sma')
+				assert (list(fast.window), fast.windowSum.value(), fast.lastTimestamp) == (list(slow.window), slow.windowSum.value(), slow.lastTimestamp)
+
+			fast, slow = MACD.MACDTimeSeries.fromTimeSeries(columnar, key = key), MACD.MACDTimeSeries.fromTimeSeries(list(periods), key = key)
+			for name in ('base', 'signal', 'emaLong', 'emaShort'):
+				assert values(getattr(fast, name), 'ema') == values(getattr(slow, name), 'ema')
+				assert getattr(fast, name).lastTimestamp == getattr(slow, name).lastTimestamp
+			fast.extend(series[0:5])
+			slow.extend(series[0:5])
+			assert values(fast.signal, 'ema') == values(slow.signal, 'ema')
+
+## The SMA has a value for every full window, within an ulp of the exact mean.
+def test_sma():
+	series = loadSeries()
+	closes = [p.close for p in reversed(series)]
+	for period in (1, 5, 10, 26, len(series)):
+		expected = [math.fsum(closes[i - period + 1:i + 1])/period for i in range(period - 1, len(closes))]
+		for source in (series, list(series)):
+			sma = SMA.SMATimeSeries.fromTimeSeries(source, period)
+			assert [p.timestamp for p in reversed(sma)] == [p.timestamp for p in reversed(series)][period - 1:]
+			for p, exact in zip(reversed(sma), expected):
+				assert p.sma == exact or abs(p.sma - exact) <= math.ulp(exact)
\ No newline at end of file
@@ -0,0 +1,81 @@
+import json
+import pytest
+import marketsnake.metrics as metrics
+
+## A disabled registry records nothing, and times nothing.
+def test_disabled():
+	registry = metrics.Registry()
+	registry.increment('bars', 5)
+	registry.observe('fetch_seconds', 0.1)
+	assert registry.timer('fetch_seconds') is metrics._NULL_TIMER
+	with registry.timer('fetch_seconds'):
+		pass
+
+	calls = []
+	timed = registry.timed('call_seconds')(lambda: calls.append(1) or 'done')
+	assert timed() == 'done' and calls == [1]
+	assert registry.counters == {} and registry.histograms == {}
+	assert registry.counter('bars') == 0 and registry.histogram('fetch_seconds') is None
+
+## Counters and histograms are kept apart by their labels.
+def test_labels():
+	registry = metrics.Registry(enabled = True)
+	registry.increment('indicators', labels = {'indicator' : 'EMA'})
+	registry.increment('indicators', 2, {'indicator' : 'EMA'})
+	registry.increment('indicators', labels = {'indicator' : 'SMA'})
+	registry.increment('indicators')
+	assert registry.counter('indicators', {'indicator' : 'EMA'}) == 3
+	assert registry.counter('indicators', {'indicator' : 'SMA'}) == 1
+	assert registry.counter('indicators') == 1
+
+	buckets = (0.1, 1.0)
+	for value in (0.05, 0.1, 0.5, 2.0):
+		registry.observe('fetch_seconds', value, {'source' : 'api', 'symbol' : 'AAPL'}, buckets)
+	registry.observe('fetch_seconds', 0.5, {'symbol' : 'AAPL', 'source' : 'cache'}, buckets)
+	histogram = registry.histogram('fetch_seconds', {'symbol' : 'AAPL', 'source' : 'api'})
+	assert histogram.counts == [2, 1, 1]
+	assert (histogram.count, histogram.sum, histogram.max) == (4, 2.65, 2.0)
+	assert histogram.quantile(0.5) == 0.1 and histogram.quantile(1.0) == 2.0
+	assert registry.histogram('fetch_seconds', {'source' : 'cache', 'symbol' : 'AAPL'}).count == 1
+
+	with registry.timer('parse_seconds', {'format' : 'json'}):
+		pass
+	assert registry.histogram('parse_seconds', {'format' : 'json'}).count == 1
+
+## The Prometheus text has counter totals, and cumulative buckets with
+#  their sum and count for histograms.
+def test_prometheus():
+	registry = metrics.Registry(enabled = True)
+	registry.increment('bars', 3, {'symbol' : 'AAPL'})
+	for value in (0.05, 0.5, 0.5, 2.0):
+		registry.observe('fetch_seconds', value, {'source' : 'api'}, (0.1, 1.0))
+
+	assert registry.toPrometheus().splitlines() == [
+		'# TYPE marketsnake_bars_total counter',
+		'marketsnake_bars_total{symbol="AAPL"} 3',
+		'# TYPE marketsnake_fetch_seconds histogram',
+		'marketsnake_fetch_seconds_bucket{source="api",le="0.1"} 1',
+		'marketsnake_fetch_seconds_bucket{source="api",le="1.0"} 3',
+		'marketsnake_fetch_seconds_bucket{source="api",le="+Inf"} 4',
+		'marketsnake_fetch_seconds_sum{source="api"} 3.05',
+		'marketsnake_fetch_seconds_count{source="api"} 4',
+	]
+	assert registry.toPrometheus(prefix = '').startswith('# TYPE bars_total counter\n')
+
+## The format of a snapshot file follows its extension, unless it is given.
+def test_writeSnapshot(tmp_path):
+	registry = metrics.Registry(enabled = True)
+	registry.increment('bars', 3)
+
+	registry.writeSnapshot(str(tmp_path / 'metrics.json'))
+	with open(str(tmp_path / 'metrics.json')) as f:
+		assert json.load(f)['counters'] == {'bars' : 3}
+
+	registry.writeSnapshot(str(tmp_path / 'metrics.prom'))
+	registry.writeSnapshot(str(tmp_path / 'metrics.txt'), format = 'json')
+	assert (tmp_path / 'metrics.prom').read_text() == registry.toPrometheus()
+	assert json.loads((tmp_path / 'metrics.txt').read_text())['counters'] == {'bars' : 3}
+	assert sorted(p.name for p in tmp_path.iterdir()) == ['metrics.json', 'metrics.prom', 'metrics.txt']
+
+	with pytest.raises(ValueError):
+		registry.writeSnapshot(str(tmp_path / 'metrics.csv'), format = 'csv')
\ No newline at end of file
@@ -0,0 +1,39 @@
+import datetime
+import os
+import marketsnake.core as core
+import marketsnake.data.alphavantage as alphavantage
+import marketsnake.data.resample as resample
+
+## Bars before the offset stay on their own day.
+def test_offsetMidnight():
+	times = [datetime.datetime(2020, 1, 1, 23, 45), datetime.datetime(2020, 1, 2, 0, 10), datetime.datetime(2020, 1, 2, 9, 40)]
+	series = core.PriceTimeSeries([core.PricePeriod(t, 1.0, 2.0, 0.5, 1.5, 10) for t in times])
+
+	coarse = resample.resample(series, 60, offset = 570)
+	assert [p.timestamp for p in reversed(coarse)] == [datetime.datetime(2020, 1, 1, 23, 30),
+		datetime.datetime(2020, 1, 2), datetime.datetime(2020, 1, 2, 9, 30)]
+
+	resampler = resample.Resampler(60, offset = 570)
+	for p in reversed(series):
+		resampler.update(p)
+	assert list(resampler.series.timestamps) == list(coarse.timestamps)
+
+def coarseBars(series):
+	return [(p.timestamp, p.open, p.high, p.low, p.close, p.volume) for p in series]
+
+## Extending with a series, a slice or a view gives the same coarse bars.
+def test_extend():
+	with open(os.path.join(os.path.dirname(__file__), 'testData.dat')) as f:
+		series = alphavantage.parseIntraday(f, 5)
+	whole = resample.resample(series, 15)
+	expected = coarseBars(resample.resample(core.PriceTimeSeries(series[0:30]), 15))
+	assert len(expected) >= 10
+
+	for periods in (series[0:30], series.window(series[29].timestamp, series[0].timestamp), list(reversed(series[0:30]))):
+		resampler = resample.Resampler(15)
+		resampler.extend(periods)
+		assert coarseBars(resampler.series) == expected
+
+	resampler = resample.Resampler(15)
+	resampler.extend(series)
+	assert coarseBars(resampler.series) == coarseBars(whole)
\ No newline at end of file
@@ -0,0 +1,123 @@
+import datetime
+import random
+import marketsnake.core as core
+import marketsnake.events.crossover as crossover
+import marketsnake.indicators.EMA as EMA
+import marketsnake.indicators.MACD as MACD
+import marketsnake.indicators.store as store
+
+START = datetime.datetime(2020, 1, 1)
+MINUTE = datetime.timedelta(minutes = 1)
+
+MAKERS = [
+	lambda: EMA.EMATimeSeries(),
+	lambda: core.AbstractTimeSeries(EMA.EMAPeriod),
+]
+
+## Random walk of one bar a minute.
+def makePrices(count, seed = 1):
+	rng = random.Random(seed)
+	close, periods = 100.0, []
+	for i in range(count):
+		close += rng.gauss(0, 1)
+		periods.append(core.PricePeriod(START + i * MINUTE, close, close + 1, close - 1, close, 100 + i))
+	return core.PriceTimeSeries(periods = periods)
+
+def values(series, field):
+	return [(p.timestamp, getattr(p, field)) for p in series]
+
+## A count limit keeps the newest periods, within the slack, for both storage engines.
+def test_maxLength():
+	for make in MAKERS:
+		for slack in (0, 0.25):
+			series = make()
+			series.setRetention(maxLength = 50, slack = slack)
+			for i in range(300):
+				series.emplace(START + i * MINUTE, ema = float(i))
+				assert len(series) <= 50 * (1 + slack)
+				assert len(series) >= min(i + 1, 50)
+				assert series.trimmed + len(series) == i + 1
+				assert [p.ema for p in series] == [float(j) for j in range(i, i - len(series), -1)]
+				if slack == 0:
+					assert len(series) == min(i + 1, 50)
+
+## An age limit keeps the periods within that age of the newest one,
+#  within the slack, for both storage engines.
+def test_maxAge():
+	maxAge = 30 * MINUTE
+	for make in MAKERS:
+		for slack in (0, 0.25):
+			series = make()
+			series.setRetention(maxAge = maxAge, slack = slack)
+			for i in range(300):
+				series.emplace(START + i * MINUTE, ema = float(i))
+				assert len(series) <= 31 * (1 + slack)
+				assert series[-1].timestamp >= series[0].timestamp - (1 + slack) * maxAge
+				assert series[-1].timestamp <= max(series[0].timestamp - maxAge, START)
+				assert series.trimmed + len(series) == i + 1
+				if slack == 0:
+					assert series[-1].timestamp == max(series[0].timestamp - maxAge, START)
+
+## Setting a limit on a series that is already over it evicts at once.
+def test_setRetention():
+	for make in MAKERS:
+		series = make()
+		for i in range(100):
+			series.emplace(START + i * MINUTE, ema = float(i))
+		series.setRetention(maxLength = 10, maxAge = 5 * MINUTE, slack = 0)
+		assert [p.ema for p in series] == [99.0, 98.0, 97.0, 96.0, 95.0, 94.0]
+		assert series.trimmed == 94
+
+## Bounds every series of a MACD.
+def bound(macd, maxLength, slack = 0.25):
+	for s in (macd.base, macd.signal, macd.emaLong, macd.emaShort):
+		s.setRetention(maxLength = maxLength, slack = slack)
+
+## A bounded MACD streams the same values and crossovers as an unbounded one,
+#  and its alignment index is rebuilt after every eviction.
+def test_boundedMACD():
+	prices = makePrices(2000)
+	whole = MACD.MACDTimeSeries.fromTimeSeries(prices)
+	expected = crossover.CrossoverEvent(whole.signal, whole.base)
+
+	for slack in (0, 0.25):
+		older = core.PriceTimeSeries(prices[1500:])
+		macd = MACD.MACDTimeSeries.fromTimeSeries(older)
+		event = crossover.CrossoverEvent(macd.signal, macd.base)
+		bound(macd, 100, slack)
+		event.delta.setRetention(maxLength = 100, slack = slack)
+		checked = 0
+
+		for p in reversed(prices[0:1500]):
+			macd.update(p)
+			event.update()
+			assert len(macd.base) <= 100 * (1 + slack)
+			if macd.base.trimmed > checked:
+				# The index was moved by the eviction, so every row is checked
+				checked = macd.base.trimmed
+				rows = [(q.timestamp, q.base.ema, q.signal.ema) for q in macd]
+				assert macd.trimmed == {k : s.trimmed for k, s in macd.series.items()}
+				newest = whole.index(rows[0][0])
+				assert rows == [(q.timestamp, q.base.ema, q.signal.ema) for q in whole[newest:newest + len(rows)]]
+		assert checked > 0
+		assert values(event, 'dir') == values(expected, 'dir')
+
+## The limits of a series are saved with it, and still hold once loaded.
+def test_store(tmp_path):
+	prices = makePrices(600)
+	macd = MACD.MACDTimeSeries.fromTimeSeries(core.PriceTimeSeries(prices[300:]))
+	bound(macd, 50)
+	macd.base.setRetention(maxLength = 50, maxAge = datetime.timedelta(hours = 1))
+	# Brings the alignment index up to date, so that it is saved too
+	len(macd)
+	store.save(str(tmp_path / 'macd.msi'), {'macd' : macd})
+	loaded = store.load(str(tmp_path / 'macd.msi'))['macd']
+
+	for s, t in zip(macd.series.values(), loaded.series.values()):
+		assert (t.maxLength, t.maxAge, t.slack) == (s.maxLength, s.maxAge, s.slack)
+	assert loaded.emaLong.maxLength == 50
+	for m in (macd, loaded):
+		m.extend(prices[0:300])
+		assert len(m.base) <= 50 * 1.25
+	assert values(loaded.signal, 'ema') == values(macd.signal, 'ema')
+	assert [(q.timestamp, q.base.ema) for q in loaded] == [(q.timestamp, q.base.ema) for q in macd]
\ No newline at end of file
@@ -0,0 +1,153 @@
+import datetime
+import math
+import random
+import pytest
+import marketsnake.core as core
+import marketsnake.events.threshold as threshold
+from marketsnake.core import Direction
+
+## Whether or not a rule fires on a move, checked directly from its definition.
+#  @returns the direction of the move if the rule fires, and None otherwise.
+def bruteForce(rule, previous, current):
+	direction = Direction.UP if current > previous else Direction.DOWN
+	if isinstance(rule, threshold.ThresholdRule):
+		crossed = (previous > rule.level) is not (current > rule.level)
+		if crossed and rule.direction in (None, direction):
+			return direction
+		return None
+	inside = lambda value: rule.low < value <= rule.high
+	if rule.enter and not inside(previous) and inside(current):
+		return direction
+	if not rule.enter and inside(previous) and not inside(current):
+		return direction
+	return None
+
+def triggered(engine, symbol, field, previous, current):
+	return sorted([(id(rule), direction.value) for rule, direction in engine.move(symbol, field, previous, current)])
+
+def expected(rules, symbol, field, previous, current):
+	fired = [(rule, bruteForce(rule, previous, current)) for rule in rules if rule.symbol == symbol and rule.field == field]
+	return sorted([(id(rule), direction.value) for rule, direction in fired if direction is not None])
+
+def randomRule(rng):
+	symbol, field = rng.choice(['AAPL', 'MSFT']), rng.choice(['close', 'high'])
+	if rng.random() < 0.5:
+		return threshold.ThresholdRule(symbol, field, rng.randint(0, 10), rng.choice([Direction.UP, Direction.DOWN, None]))
+	low = rng.randint(0, 9)
+	return threshold.BandRule(symbol, field, low, rng.randint(low + 1, 10), rng.random() < 0.5)
+
+## Every move triggers the same rules as checking each rule on its own,
+#  including moves onto, off and between levels, and after rules are removed.
+def test_bruteForce():
+	rng = random.Random(1)
+	rules = [randomRule(rng) for _ in range(200)]
+	engine = threshold.ThresholdEngine()
+	for rule in rules:
+		engine.add(rule)
+	assert len(engine) == len(rules)
+
+	for i in range(2000):
+		if i % 200 == 199:
+			removed = rules[:20]
+			rules = rules[20:]
+			for rule in removed:
+				engine.remove(rule)
+				assert rule not in engine
+		symbol, field = rng.choice(['AAPL', 'MSFT']), rng.choice(['close', 'high'])
+		# Values are mostly on levels, so that moves start and end on edges
+		previous, current = [rng.randint(-1, 11) if rng.random() < 0.7 else rng.uniform(-1, 11) for _ in range(2)]
+		assert triggered(engine, symbol, field, previous, current) == expected(rules, symbol, field, previous, current)
+	assert len(engine) == len(rules)
+
+## Threshold rules fire on crossing up, down or both ways.
+def test_threshold():
+	engine = threshold.ThresholdEngine()
+	up = threshold.ThresholdRule('AAPL', 'close', 10)
+	down = threshold.ThresholdRule('AAPL', 'close', 10, Direction.DOWN)
+	both = threshold.ThresholdRule('AAPL', 'close', 10, None)
+	for rule in (up, down, both):
+		engine.add(rule)
+
+	assert engine.move('AAPL', 'close', 9, 11) == [(up, Direction.UP), (both, Direction.UP)]
+	assert engine.move('AAPL', 'close', 11, 9) == [(down, Direction.DOWN), (both, Direction.DOWN)]
+	assert engine.move('AAPL', 'close', 11, 12) == []
+	assert engine.move('MSFT', 'close', 9, 11) == []
+	assert engine.move('AAPL', 'open', 9, 11) == []
+
+	# Being at a level is not above it
+	assert engine.move('AAPL', 'close', 9, 10) == []
+	assert engine.move('AAPL', 'close', 10, 11) == [(up, Direction.UP), (both, Direction.UP)]
+	assert engine.move('AAPL', 'close', 11, 10) == [(down, Direction.DOWN), (both, Direction.DOWN)]
+	assert engine.move('AAPL', 'close', 10, 9) == []
+	assert engine.move('AAPL', 'close', 10, 10) == []
+
+## Band rules fire on entering or leaving the band, and not on jumping over it.
+def test_band():
+	engine = threshold.ThresholdEngine()
+	enter = threshold.BandRule('AAPL', 'close', 10, 20)
+	leave = threshold.BandRule('AAPL', 'close', 10, 20, enter = False)
+	engine.add(enter)
+	engine.add(leave)
+
+	assert engine.move('AAPL', 'close', 5, 15) == [(enter, Direction.UP)]
+	assert engine.move('AAPL', 'close', 25, 15) == [(enter, Direction.DOWN)]
+	assert engine.move('AAPL', 'close', 15, 5) == [(leave, Direction.DOWN)]
+	assert engine.move('AAPL', 'close', 15, 25) == [(leave, Direction.UP)]
+	assert engine.move('AAPL', 'close', 12, 18) == []
+
+	assert engine.move('AAPL', 'close', 5, 25) == []
+	assert engine.move('AAPL', 'close', 25, 5) == []
+	assert engine.move('AAPL', 'close', 10, 21) == []
+
+	# The band holds its high but not its low
+	assert engine.move('AAPL', 'close', 10, 20) == [(enter, Direction.UP)]
+	assert engine.move('AAPL', 'close', 20, 10) == [(leave, Direction.DOWN)]
+	assert engine.move('AAPL', 'close', 25, 20) == [(enter, Direction.DOWN)]
+	assert engine.move('AAPL', 'close', 20, 21) == [(leave, Direction.UP)]
+
+	with pytest.raises(ValueError):
+		threshold.BandRule('AAPL', 'close', 20, 20)
+
+## Removed rules no longer fire, and their indices are dropped once empty.
+def test_remove():
+	engine = threshold.ThresholdEngine()
+	first = threshold.ThresholdRule('AAPL', 'close', 10)
+	second = threshold.ThresholdRule('AAPL', 'close', 10)
+	band = threshold.BandRule('AAPL', 'close', 5, 15)
+	for rule in (first, second, band):
+		engine.add(rule)
+	engine.add(first)
+	assert len(engine) == 3
+
+	engine.remove(first)
+	assert first not in engine and second in engine
+	assert engine.move('AAPL', 'close', 9, 11) == [(second, Direction.UP)]
+	engine.remove(second)
+	engine.remove(band)
+	assert len(engine) == 0
+	assert engine.indices == {} and engine.fields == {}
+	assert engine.move('AAPL', 'close', 0, 20) == []
+	with pytest.raises(KeyError):
+		engine.remove(band)
+
+## Values are checked against the last one seen, skipping NaNs, and
+#  triggered rules broadcast through their alerts.
+def test_update():
+	alerts = []
+	engine = threshold.ThresholdEngine()
+	rule = threshold.ThresholdRule('AAPL', 'close', 10, None, alert = alerts.append)
+	engine.add(rule)
+
+	assert engine.updateValue('AAPL', 'close', 9) == []
+	assert engine.updateValue('AAPL', 'close', math.nan) == []
+	assert engine.updateValue('AAPL', 'close', 11) == [(rule, Direction.UP)]
+	assert engine.updateValue('AAPL', 'close', math.nan) == []
+	assert engine.updateValue('AAPL', 'close', 12) == []
+	assert engine.updateValue('MSFT', 'close', 9) == []
+
+	timestamp = datetime.datetime(2020, 1, 1, 9, 35)
+	period = core.PricePeriod(timestamp, open = 12, high = 12, low = 8, close = 8, volume = 100)
+	assert engine.update('AAPL', period) == [(rule, Direction.DOWN)]
+	assert engine.update('MSFT', period) == []
+	assert len(alerts) == 2
+	assert alerts[1] == rule.describe(timestamp, 8, Direction.DOWN)
\ No newline at end of file
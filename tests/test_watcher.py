@@ -0,0 +1,120 @@
+import asyncio
+import datetime
+import os
+import zoneinfo
+import marketsnake.alerts.alert as alert
+import marketsnake.data.alphavantage as alphavantage
+import marketsnake.events.crossover as crossover
+import marketsnake.indicators.MACD as MACD
+import marketsnake.watcher as watcher
+
+DATA = os.path.join(os.path.dirname(__file__), 'testData.dat')
+
+class CollectAlert(alert.AbstractAlert):
+	def __init__(self):
+		super().__init__(None)
+		self.bodies = []
+
+	def __call__(self, body):
+		self.bodies.append(body)
+
+def loadSeries():
+	with open(DATA) as f:
+		return alphavantage.parseIntraday(f, 5)
+
+## Runs a watcher over recorded bars with a fake clock.
+#  @returns the alerts of each symbol, the watcher and the clock.
+def run(series, start, until, symbols = ('AAPL', 'MSFT'), storeDirectory = None):
+	clock = watcher.FakeClock(start)
+	source = watcher.LocalSource({symbol : series for symbol in symbols}, clock)
+	alerts = {symbol : CollectAlert() for symbol in symbols}
+	watches = [watcher.CrossoverWatch(symbol, 5, alerts[symbol]) for symbol in symbols]
+	w = watcher.Watcher(source, watches, clock = clock, maxConcurrent = 1, storeDirectory = storeDirectory)
+	asyncio.run(w.run(until = until))
+	return alerts, w, clock
+
+def expectedAlerts(series, after, before = None):
+	macd = MACD.MACDTimeSeries.fromTimeSeries(series)
+	event = crossover.CrossoverEvent(macd.signal, macd.base)
+	return [str(p) for p in reversed(event) if p.timestamp > after and (before is None or p.timestamp < before)]
+
+## Bar closes are aligned to the interval since midnight.
+def test_nextClose():
+	assert watcher.nextClose(datetime.datetime(2020, 1, 1, 9, 31, 10), 5) == datetime.datetime(2020, 1, 1, 9, 35)
+	assert watcher.nextClose(datetime.datetime(2020, 1, 1, 9, 35), 5) == datetime.datetime(2020, 1, 1, 9, 40)
+	assert watcher.nextClose(datetime.datetime(2020, 1, 1, 23, 58), 5) == datetime.datetime(2020, 1, 2)
+
+## Streaming bars through the watcher alerts on the same crossovers as
+#  finding them over the whole history at once.
+def test_alerts():
+	series = loadSeries()
+	first = series[-40].timestamp
+	alerts, w, _ = run(series, first + datetime.timedelta(minutes = 5, seconds = 1),
+		series[0].timestamp + datetime.timedelta(minutes = 10))
+
+	expected = expectedAlerts(series, first)
+	assert expected
+	assert alerts['AAPL'].bodies == expected
+	assert alerts['MSFT'].bodies == expected
+	assert w.failed == 0
+
+## A watcher restarted from its store carries on where it stopped.
+def test_restart(tmp_path):
+	series = loadSeries()
+	first = series[-40].timestamp
+	before, _, clock = run(series, first + datetime.timedelta(minutes = 5, seconds = 1), series[-70].timestamp,
+		storeDirectory = str(tmp_path))
+	after, _, _ = run(series, clock.now(), series[0].timestamp + datetime.timedelta(minutes = 10),
+		storeDirectory = str(tmp_path))
+	assert before['AAPL'].bodies + after['AAPL'].bodies == expectedAlerts(series, first)
+
+## Stopping a watcher ends its run.
+def test_stop():
+	series = loadSeries()
+
+	async def stop():
+		clock = watcher.SystemClock()
+		w = watcher.Watcher(watcher.LocalSource({'AAPL' : series}, clock), [watcher.CrossoverWatch('AAPL', 5)], clock = clock)
+		task = asyncio.ensure_future(w.run())
+		await asyncio.sleep(0.2)
+		w.stop()
+		await asyncio.wait_for(task, 2)
+		return w
+
+	assert asyncio.run(stop()).cycles == 1
+
+## System clock on a fake UTC time, advanced only by sleeping.
+class UTCFakeClock(watcher.SystemClock):
+	def __init__(self, utc, timezone):
+		super().__init__(timezone)
+		self.utc = utc
+
+	def _utcnow(self):
+		return self.utc
+
+	async def sleep(self, seconds):
+		self.utc += datetime.timedelta(seconds = max(seconds, 0))
+		await asyncio.sleep(0)
+
+## A clock running in another time zone from the bars reads the time in
+#  the time zone of the bars, so the bar that is still forming is left out.
+def test_timezone():
+	series = loadSeries()
+	first = series[-40].timestamp
+	start = first + datetime.timedelta(minutes = 5, seconds = 1)
+	utc = start.replace(tzinfo = zoneinfo.ZoneInfo(watcher.BAR_TIMEZONE)).astimezone(datetime.timezone.utc)
+	clock = UTCFakeClock(utc, watcher.BAR_TIMEZONE)
+	assert clock.now() == start
+	assert watcher.SystemClock('UTC').timezone == zoneinfo.ZoneInfo('UTC')
+
+	collect = CollectAlert()
+	w = watcher.Watcher(watcher.LocalSource({'AAPL' : series}, clock, forming = True),
+		[watcher.CrossoverWatch('AAPL', 5, collect)], clock = clock, delay = 1)
+	middle = series[20].timestamp + datetime.timedelta(minutes = 5, seconds = 30)
+	asyncio.run(w.run(until = middle))
+
+	# The newest bar watched is the last one closed, not the one forming
+	assert clock.now() >= series[20].timestamp + datetime.timedelta(minutes = 5)
+	assert clock.now() < series[19].timestamp + datetime.timedelta(minutes = 5)
+	assert w.watches[0].series[0].timestamp == series[20].timestamp
+	assert collect.bodies == expectedAlerts(series, first, series[19].timestamp)
\ No newline at end of file